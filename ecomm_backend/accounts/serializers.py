@@ -35,3 +35,10 @@ class CustomUserSerializer(serializers.ModelSerializer):
             instance.set_password(password)
         instance.save()
         return instance
+
+
+class UserSummarySerializer(serializers.ModelSerializer):
+    # Public fields of a user embedded in another payload; needs only select_related('user')
+    class Meta:
+        model = CustomUser
+        fields = ['id', 'username', 'email']
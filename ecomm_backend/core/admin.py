@@ -1,6 +1,13 @@
 from django.contrib import admin
 
-from .models import MyPayout
+from .models import MyPayout, OutboxMessage
 
 
 admin.site.register(MyPayout)
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('topic', 'status', 'attempts', 'available_at', 'created_at')
+    list_filter = ('status', 'topic')
+    date_hierarchy = 'created_at'
@@ -0,0 +1,92 @@
+import hashlib
+import uuid
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+
+
+CATALOG_CACHE = 'catalog'
+
+
+def _tag_key(tag):
+    return f'tag:{tag}'
+
+
+def _response_key(request):
+    # Normalize the query string so ?a=1&b=2 and ?b=2&a=1 share an entry
+    query = urlencode(sorted((key, value) for key, values in request.GET.lists() for value in values))
+    digest = hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+    return f'response:{digest}'
+
+
+def _current_versions(cache, tags):
+    return cache.get_many([_tag_key(tag) for tag in tags])
+
+
+def _ensure_versions(cache, tags):
+    versions = _current_versions(cache, tags)
+    for tag in tags:
+        key = _tag_key(tag)
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return versions
+
+
+def invalidate_tags(tags, alias=CATALOG_CACHE):
+    """
+    Expire every cached response carrying one of `tags`. Entries are never
+    enumerated: each tag has a version token and entries remember the tokens
+    they were stored under, so replacing the token orphans them.
+    """
+    cache = caches[alias]
+    cache.set_many({_tag_key(tag): uuid.uuid4().hex for tag in tags}, None)
+
+
+def invalidate_tags_on_commit(tags, using='default', alias=CATALOG_CACHE):
+    tags = list(tags)
+    transaction.on_commit(lambda: invalidate_tags(tags, alias), using=using)
+
+
+def cache_response(tags, timeout=None, alias=CATALOG_CACHE):
+    """
+    Cache successful GET responses of a public view, keyed on the path and
+    normalized query string. `tags` is a callable (request, *args, **kwargs)
+    returning the tags the response depends on.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+
+            cache = caches[alias]
+            key = _response_key(request)
+            entry_tags = list(tags(request, *args, **kwargs))
+
+            entry = cache.get(key)
+            if entry is not None and entry['versions'] == _current_versions(cache, entry_tags):
+                response = HttpResponse(entry['content'], content_type=entry['content_type'])
+                response['X-Cache'] = 'HIT'
+                return response
+
+            # Read the versions before rendering: an invalidation that lands
+            # mid-render then leaves this entry already stale
+            versions = _ensure_versions(cache, entry_tags)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                if hasattr(response, 'render') and not response.is_rendered:
+                    response.render()
+                cache.set(key, {
+                    'content': response.content,
+                    'content_type': response['Content-Type'],
+                    'versions': versions,
+                }, timeout if timeout is not None else settings.CATALOG_CACHE_TIMEOUT)
+                response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,99 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+HEADER = 'Idempotency-Key'
+
+
+def _request_hash(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def _error(message, status):
+    return Response({'status': 'error', 'message': message}, status=status)
+
+
+def idempotent(view):
+    """
+    Honour an Idempotency-Key header on an authenticated DRF view (place it
+    below @api_view). The first response is stored under (user, key) with a
+    hash of the request; a retry of the same request gets it replayed without
+    the view running again. Server errors are not stored so they can be retried.
+    While the first request runs, its key is leased; a retry after the lease
+    ran out (the worker died mid-request) takes the key over and runs the view.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > 255:
+            return _error(f'{HEADER} must be at most 255 characters', 400)
+
+        now = timezone.now()
+        request_hash = _request_hash(request)
+        locked_until = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_LEASE_SECONDS)
+        # Nothing is replayed past expiry, even before the purge command has run
+        IdempotencyKey.objects.filter(user=request.user, key=key, expires_at__lte=now).delete()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=request.user,
+                    key=key,
+                    request_hash=request_hash,
+                    locked_until=locked_until,
+                    expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+                )
+        except IntegrityError:
+            record = IdempotencyKey.objects.get(user=request.user, key=key)
+            if record.request_hash != request_hash:
+                return _error(f'{HEADER} was already used for a different request', 422)
+            if record.is_complete:
+                return Response(record.response_body, status=record.response_status, headers={'Idempotent-Replayed': 'true'})
+            # Conditional, so of several retries only one takes an expired lease over
+            reclaimed = IdempotencyKey.objects.filter(
+                Q(locked_until__lt=now) | Q(locked_until__isnull=True), pk=record.pk, is_complete=False
+            ).update(locked_until=locked_until)
+            if not reclaimed:
+                return _error(f'A request with this {HEADER} is still being processed', 409)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 500:
+            record.delete()
+        else:
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                is_complete=True,
+                locked_until=None,
+                response_status=response.status_code,
+                response_body=getattr(response, 'data', None),
+            )
+        return response
+    return wrapper
+
+
+def purge_expired_keys(batch_size=5000):
+    """Delete expired keys in batches so SQLite never holds the write lock for long."""
+    deleted = 0
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+
+# Snowflake layout: 42 bits of milliseconds since EPOCH_MS, 10 bits of worker
+# id, 12 bits of per-millisecond sequence (4096 ids per ms per worker)
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+# The worker id is the host id (ID_HOST_ID, one per machine) followed by a
+# slot that each process on the host holds exclusively for its lifetime
+HOST_BITS = 4
+SLOT_BITS = WORKER_BITS - HOST_BITS
+MAX_HOST_ID = (1 << HOST_BITS) - 1
+SLOTS = 1 << SLOT_BITS
+
+# Crockford base32: no I, L, O or U, so ids survive being read out or retyped.
+# Digits sort before letters, so fixed-width encodings sort like the numbers.
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+ENCODED_LENGTH = 13  # ceil(64 / 5)
+
+
+def encode(value):
+    chars = []
+    for _ in range(ENCODED_LENGTH):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+
+def decode(text):
+    value = 0
+    for char in text.upper():
+        value = (value << 5) | ALPHABET.index(char)
+    return value
+
+
+def _acquire_slot():
+    """
+    Lock the first free slot file of this host and return (slot, fd). The
+    lock is held until the fd is closed or the process dies, so no two live
+    processes on the host hold the same slot, whatever their pids.
+    """
+    import fcntl
+
+    directory = Path(settings.ID_SLOT_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    for slot in range(SLOTS):
+        fd = os.open(directory / f'slot-{slot}.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            continue
+        return slot, fd
+    raise RuntimeError(f'All {SLOTS} id worker slots in {directory} are taken')
+
+
+def _host_id():
+    host_id = int(settings.ID_HOST_ID)
+    if not 0 <= host_id <= MAX_HOST_ID:
+        raise ValueError(f'ID_HOST_ID must be between 0 and {MAX_HOST_ID}, got {host_id}')
+    return host_id
+
+
+class IdGenerator:
+    """
+    Monotonic, k-sortable 64-bit ids. Ids from one generator always increase,
+    even if the system clock steps back: the generator keeps using its last
+    timestamp and borrows the next millisecond when a sequence runs out,
+    instead of sleeping.
+    """
+
+    def __init__(self, worker_id=None):
+        self._lock = threading.Lock()
+        self._fixed_worker_id = worker_id
+        self._slot_fd = None
+        self._reset()
+
+    def _reset(self):
+        self.worker_id = self._fixed_worker_id
+        self._last_ms = -1
+        self._sequence = 0
+
+    def _lease_worker_id(self):
+        slot, self._slot_fd = _acquire_slot()
+        return (_host_id() << SLOT_BITS) | slot
+
+    def release(self):
+        """Give the slot back; the next id leases a slot again."""
+        with self._lock:
+            if self._slot_fd is not None:
+                os.close(self._slot_fd)
+                self._slot_fd = None
+            self._reset()
+
+    def after_fork(self):
+        # A forked worker must not continue the parent's sequence under the
+        # parent's worker id. Closing the inherited fd keeps the parent's lock,
+        # so the child leases a slot of its own.
+        self._lock = threading.Lock()
+        if self._slot_fd is not None:
+            os.close(self._slot_fd)
+            self._slot_fd = None
+        self._reset()
+
+    def next_int(self):
+        with self._lock:
+            if self.worker_id is None:
+                self.worker_id = self._lease_worker_id()
+
+            now_ms = int(time.time() * 1000) - EPOCH_MS
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    self._last_ms += 1
+                    self._sequence = 0
+
+            return (self._last_ms << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+    def next_id(self, prefix=''):
+        return f'{prefix}{encode(self.next_int())}'
+
+
+generator = IdGenerator()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=generator.after_fork)
+
+
+def generate_id(prefix=''):
+    """A new unique id, e.g. generate_id('ORD-') -> 'ORD-0C8ZQ6W1R2004'."""
+    return generator.next_id(prefix)
@@ -0,0 +1,35 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from core.outbox import drain
+
+
+class Command(BaseCommand):
+    help = 'Carry out queued outbox messages (payouts and other order side effects) with a thread pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--lease', type=int, default=60, help='Seconds before an unfinished message is retried')
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--once', action='store_true', help='Exit once nothing is ready instead of polling')
+
+    def handle(self, *args, **options):
+        processed = failed = 0
+        self.stdout.write(f"Outbox worker started with {options['workers']} threads")
+        try:
+            with ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='outbox') as executor:
+                while True:
+                    claimed, succeeded = drain(executor, options['batch_size'], options['lease'])
+                    processed += succeeded
+                    failed += claimed - succeeded
+                    if claimed:
+                        continue
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} messages, {failed} failed'))
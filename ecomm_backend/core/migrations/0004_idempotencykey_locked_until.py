@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 
@@ -10,3 +12,57 @@ class MyPayout(models.Model):
 
     def __str__(self):
         return self.payoutId
+
+
+OUTBOX_STATUS_CHOICES = (
+    ('pending', 'Pending'),
+    ('processing', 'Processing'),
+    ('done', 'Done'),
+    ('failed', 'Failed'),
+)
+
+class OutboxMessage(models.Model):
+    # Side effect recorded in the same transaction as the change that caused
+    # it, and carried out later by `manage.py run_outbox_worker`
+    topic = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=OUTBOX_STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField()
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='outbox_ready_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.topic} ({self.status})'
+
+
+class IdempotencyKey(models.Model):
+    # First response to a request sent with an Idempotency-Key header, replayed
+    # to retries of the same request until expires_at
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    is_complete = models.BooleanField(default=False)
+    # While incomplete, the request holding the key; a retry may take the key
+    # over once this has passed (the worker died mid-request)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return self.key
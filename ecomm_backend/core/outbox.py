@@ -0,0 +1,120 @@
+import random
+import traceback
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+
+MAX_ATTEMPTS = 10
+BACKOFF_BASE = 2       # seconds before the first retry, doubled on each attempt
+BACKOFF_MAX = 3600
+
+_handlers = {}
+
+
+def handler(topic):
+    """
+    Register the function that carries out messages of `topic`. It receives
+    the payload and runs in a transaction with the message's completion, so
+    its database writes happen once even though delivery is at-least-once.
+    """
+    def decorator(func):
+        _handlers[topic] = func
+        return func
+    return decorator
+
+
+def enqueue(topic, payload):
+    """Record a side effect; call inside the transaction that causes it."""
+    return OutboxMessage.objects.create(topic=topic, payload=payload, available_at=timezone.now())
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    # Jitter keeps retries of a failed batch from landing together
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def claim(batch_size=50, lease_seconds=60):
+    """
+    Lease up to `batch_size` ready messages to this worker. Messages whose
+    lease ran out (their worker died) are ready again.
+    """
+    now = timezone.now()
+    ready = (
+        Q(status='pending', available_at__lte=now) |
+        Q(status='processing', locked_until__lt=now)
+    )
+    with transaction.atomic():
+        ids = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(ready).order_by('available_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        OutboxMessage.objects.filter(id__in=ids).update(
+            status='processing',
+            locked_until=now + timedelta(seconds=lease_seconds),
+            attempts=F('attempts') + 1,
+            updated_at=now,
+        )
+        return list(OutboxMessage.objects.filter(id__in=ids).order_by('available_at', 'id'))
+
+
+def process(message):
+    """Run one claimed message, then mark it done or schedule its retry."""
+    try:
+        with transaction.atomic():
+            func = _handlers.get(message.topic)
+            if func is None:
+                raise LookupError(f'No outbox handler for {message.topic!r}')
+            func(message.payload)
+            OutboxMessage.objects.filter(pk=message.pk).update(
+                status='done', locked_until=None, processed_at=timezone.now(), last_error=''
+            )
+        return True
+    except Exception:
+        now = timezone.now()
+        failed = message.attempts >= MAX_ATTEMPTS
+        OutboxMessage.objects.filter(pk=message.pk).update(
+            status='failed' if failed else 'pending',
+            available_at=now if failed else now + backoff(message.attempts),
+            locked_until=None,
+            last_error=traceback.format_exc(limit=5),
+            updated_at=now,
+        )
+        return False
+
+
+def _process_in_worker(message):
+    # Pool threads hold their own connections; treat each message like a request
+    close_old_connections()
+    try:
+        return process(message)
+    finally:
+        close_old_connections()
+
+
+def drain(executor, batch_size=50, lease_seconds=60):
+    """Claim one batch and run it on the `executor` thread pool. Returns (claimed, succeeded)."""
+    messages = claim(batch_size, lease_seconds)
+    if not messages:
+        return 0, 0
+    results = list(executor.map(_process_in_worker, messages))
+    return len(messages), sum(results)
+
+
+def run_pending(batch_size=50):
+    """Process everything that is ready now in the calling thread, e.g. from tests."""
+    claimed_total = succeeded_total = 0
+    while True:
+        messages = claim(batch_size)
+        if not messages:
+            return claimed_total, succeeded_total
+        claimed_total += len(messages)
+        succeeded_total += sum(process(message) for message in messages)
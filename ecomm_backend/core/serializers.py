@@ -0,0 +1,69 @@
+from rest_framework import serializers
+
+
+def parse_fieldset(request):
+    """Read `fields=` / `expand=` from the query string: (set or None, set)."""
+    def _split(value):
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    fields = request.GET.get('fields')
+    expand = request.GET.get('expand')
+    return (_split(fields) if fields else None), (_split(expand) if expand else set())
+
+
+class SparseFieldsetMixin:
+    """
+    Sparse fieldsets for a ModelSerializer.
+
+    Without `fields` the full representation is returned. With `fields`, only
+    the listed fields are rendered and nested relations among them collapse to
+    primary keys unless they are also listed in `expand`.
+
+    `related_lookups` maps a field to the (select_related, prefetch_related,
+    pk-only prefetch_related) lookups it needs, so optimize_queryset() only
+    joins and prefetches what will actually be rendered.
+    """
+    related_lookups = {}
+    expandable_fields = ()
+    deferrable_fields = ()
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None:
+            return
+
+        expand = expand or set()
+        for name in list(self.fields):
+            if name not in fields:
+                self.fields.pop(name)
+            elif name in self.expandable_fields and name not in expand:
+                field = self.fields[name]
+                options = {'many': isinstance(field, serializers.ListSerializer)}
+                if field.source != name:
+                    options['source'] = field.source
+                self.fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, **options)
+
+    @classmethod
+    def optimize_queryset(cls, queryset, fields=None, expand=None):
+        expand = expand or set()
+        select, prefetch = set(), set()
+
+        for name, (select_lookups, prefetch_lookups, pk_lookups) in cls.related_lookups.items():
+            if fields is not None and name not in fields:
+                continue
+            if fields is not None and name in cls.expandable_fields and name not in expand:
+                # Foreign key ids are already on the row; reverse/m2m ids need one prefetch
+                prefetch.update(pk_lookups)
+                continue
+            select.update(select_lookups)
+            prefetch.update(prefetch_lookups)
+
+        if select:
+            queryset = queryset.select_related(*sorted(select))
+        if prefetch:
+            queryset = queryset.prefetch_related(*sorted(prefetch))
+        if fields is not None:
+            deferred = [name for name in cls.deferrable_fields if name not in fields]
+            if deferred:
+                queryset = queryset.defer(*deferred)
+        return queryset
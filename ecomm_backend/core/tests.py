@@ -1,3 +1,231 @@
-from django.test import TestCase
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from accounts.models import CustomUser
+from products.models import Product
+from sellers.models import Seller
+from . import ids, outbox
+from .cache import cache_response, invalidate_tags
+from .idempotency import idempotent, purge_expired_keys
+from .models import IdempotencyKey, OutboxMessage
+from .pagination import InvalidCursor, encode_cursor, paginate_keyset
+
+
+class OutboxTests(TestCase):
+
+    def setUp(self):
+        self.calls = []
+        outbox.handler('test.ok')(self.calls.append)
+        outbox.handler('test.fail')(self._fail)
+
+    def _fail(self, payload):
+        raise RuntimeError('boom')
+
+    def test_message_is_processed_once(self):
+        message = outbox.enqueue('test.ok', {'id': 1})
+
+        self.assertEqual(outbox.run_pending(), (1, 1))
+        self.assertEqual(outbox.run_pending(), (0, 0))
+        self.assertEqual(self.calls, [{'id': 1}])
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('done', 1))
+
+    def test_failure_is_retried_with_backoff(self):
+        message = outbox.enqueue('test.fail', {})
+
+        self.assertEqual(outbox.run_pending(), (1, 0))
+        message.refresh_from_db()
+        self.assertEqual(message.status, 'pending')
+        self.assertGreater(message.available_at, timezone.now())
+        self.assertIn('boom', message.last_error)
+
+        OutboxMessage.objects.filter(pk=message.pk).update(attempts=outbox.MAX_ATTEMPTS - 1, available_at=timezone.now())
+        outbox.run_pending()
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('failed', outbox.MAX_ATTEMPTS))
+
+    def test_expired_lease_is_reclaimed(self):
+        message = outbox.enqueue('test.ok', {})
+        self.assertEqual(len(outbox.claim()), 1)
+        self.assertEqual(outbox.claim(), [])
+
+        OutboxMessage.objects.filter(pk=message.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(outbox.run_pending(), (1, 1))
+
+
+class IdempotencyTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.calls = 0
+        self.dying = True
+
+        @api_view(['POST'])
+        @idempotent
+        def view(request):
+            self.calls += 1
+            if request.data.get('die') and self.dying:
+                raise SystemExit
+            if request.data.get('fail'):
+                return Response({'status': 'error'}, status=500)
+            return Response({'status': 'success', 'call': self.calls}, status=201)
+        self.view = view
+
+    def post(self, data, key='key-1'):
+        request = APIRequestFactory().post('/pay/', data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        force_authenticate(request, self.user)
+        return self.view(request)
+
+    def test_retry_replays_first_response(self):
+        first, retry = self.post({'amount': 10}), self.post({'amount': 10})
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual((retry.status_code, retry.data), (201, {'status': 'success', 'call': 1}))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.post({'amount': 20}).status_code, 422)
+
+    def test_abandoned_key_is_reclaimed_after_its_lease(self):
+        # The worker dies mid-request, leaving the key incomplete
+        with self.assertRaises(SystemExit):
+            self.post({'die': True})
+        self.assertEqual(self.post({'die': True}).status_code, 409)
+
+        IdempotencyKey.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.dying = False
+        self.assertEqual(self.post({'die': True}).status_code, 201)
+        retry = self.post({'die': True})
+        self.assertEqual((retry['Idempotent-Replayed'], self.calls), ('true', 2))
+
+    def test_server_errors_are_not_stored(self):
+        self.assertEqual(self.post({'fail': True}).status_code, 500)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_expired_keys_are_purged(self):
+        self.post({'amount': 10})
+        self.post({'amount': 10}, key='key-2')
+        IdempotencyKey.objects.filter(key='key-1').update(expires_at=timezone.now())
+
+        self.assertEqual(purge_expired_keys(batch_size=1), 1)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['key-2'])
+
+
+class TaggedCacheTests(TestCase):
+
+    def setUp(self):
+        caches['catalog'].clear()
+        self.calls = 0
+
+        @cache_response(tags=lambda request, name: [f'item:{name}', 'catalog'])
+        @api_view(['GET'])
+        def view(request, name):
+            self.calls += 1
+            return Response({'name': name, 'call': self.calls})
+        self.view = view
+
+    def get(self, name, query=''):
+        return self.view(RequestFactory().get(f'/items/{name}/{query}'), name=name)
+
+    def test_hit_and_miss(self):
+        self.assertEqual(self.get('a')['X-Cache'], 'MISS')
+        hit = self.get('a')
+        self.assertEqual((hit['X-Cache'], self.calls), ('HIT', 1))
+        self.assertIn(b'"call":1', hit.content)
+
+        # The query string is normalized, and a different one is its own entry
+        self.assertEqual(self.get('a', '?x=1&y=2')['X-Cache'], 'MISS')
+        self.assertEqual(self.get('a', '?y=2&x=1')['X-Cache'], 'HIT')
+
+    def test_invalidation_is_per_tag(self):
+        self.get('a'), self.get('b')
+        invalidate_tags(['item:a'])
+        self.assertEqual(self.get('a')['X-Cache'], 'MISS')
+        self.assertEqual(self.get('b')['X-Cache'], 'HIT')
+
+        invalidate_tags(['catalog'])
+        self.assertEqual(self.get('b')['X-Cache'], 'MISS')
+
+    def test_seller_save_expires_catalog(self):
+        self.get('a')
+        user = CustomUser.objects.create_user('seller', 'seller@example.com', 'password')
+        with self.captureOnCommitCallbacks(execute=True):
+            Seller.objects.create(user=user, business_name='Shop', business_address='Street', phone_number='1')
+        self.assertEqual(self.get('a')['X-Cache'], 'MISS')
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        # Ties on price, so only the trailing id keeps the order unique
+        for index in range(7):
+            Product.objects.create(productId=f'pr-{index}', name='p', description='', base_price=10 + index % 2)
+
+    def test_pages_cover_every_row_once(self):
+        ordering = ('base_price', 'id')
+        seen, cursor = [], None
+        while True:
+            page, cursor = paginate_keyset(Product.objects.all(), ordering, cursor, page_size=3)
+            seen += [product.id for product in page]
+            if cursor is None:
+                break
+        expected = list(Product.objects.order_by(*ordering).values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_tampered_cursor_is_rejected(self):
+        for cursor in ('not base64!', encode_cursor([1]), encode_cursor(['abc', 'xyz']), encode_cursor([None, 1])):
+            with self.assertRaises(InvalidCursor):
+                paginate_keyset(Product.objects.all(), ('-created_at', '-id'), cursor)
+
+        response = self.client.get('/api/products/list/', {'cursor': encode_cursor(['abc', 'xyz'])})
+        self.assertEqual((response.status_code, response.json()['message']), (400, 'Invalid cursor'))
+
+
+class IdGeneratorTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(ID_SLOT_DIR=directory.name, ID_HOST_ID=3)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def generator(self):
+        generator = ids.IdGenerator()
+        self.addCleanup(generator.release)
+        return generator
+
+    def test_generators_lease_distinct_worker_ids(self):
+        first, second = self.generator(), self.generator()
+        # Same millisecond for both, as for two forked workers of one host
+        with mock.patch('core.ids.time.time', return_value=1800000000.0):
+            first_ids = {first.next_id() for _ in range(2000)}
+            second_ids = {second.next_id() for _ in range(2000)}
+
+        self.assertNotEqual(first.worker_id, second.worker_id)
+        self.assertEqual({first.worker_id >> ids.SLOT_BITS, second.worker_id >> ids.SLOT_BITS}, {3})
+        self.assertEqual(len(first_ids | second_ids), 4000)
+
+    def test_released_slot_is_reused(self):
+        first = self.generator()
+        first.next_id()
+        worker_id = first.worker_id
+        first.release()
+        self.assertEqual(self.generator().next_int() >> ids.SEQUENCE_BITS & ids.MAX_WORKER_ID, worker_id)
+
+    def test_ids_increase_when_clock_steps_back(self):
+        generator = self.generator()
+        clock = [1800000000.0] * 5000 + [1799999999.0] * 10
+        with mock.patch('core.ids.time.time', side_effect=clock):
+            values = [generator.next_int() for _ in clock]
+
+        self.assertEqual(values, sorted(set(values)))
+        encoded = [ids.encode(value) for value in values]
+        self.assertEqual(encoded, sorted(encoded))
+        self.assertEqual([ids.decode(text) for text in encoded], values)
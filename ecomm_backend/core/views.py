@@ -6,7 +6,7 @@ from sellers.models import Seller
 from sellers.serializer import SellerSerializer
 from orders.models import OrderItem
 from django.db.models import Sum, Count
-from sellers.models import SellerPayout
+from sellers.models import SellerBalance, SellerPayout
 from sellers.serializer import SellerPayoutSerializer
 from .models import MyPayout
 
@@ -59,31 +59,16 @@ def get_seller_payout_stats(request):
     try:
         seller = request.user.seller
 
-        # Get total pending payouts
-        pending_payouts = SellerPayout.objects.filter(
-            seller=seller,
-            is_paid=False,
-            isRefunded=False,
-            orderItem__paymentDetail__is_paid=True)
-
-        pendingTotal = sum(payout.amount for payout in pending_payouts)
-
-        # Get total paid payouts
-        paid_payouts = SellerPayout.objects.filter(
-            seller=seller,
-            is_paid=True,
-            isRefunded=False,
-            orderItem__paymentDetail__is_paid=True)
-
-        paidTotal = sum(payout.amount for payout in paid_payouts)
+        # Maintained from the payout ledger, see sellers.ledger
+        balance = SellerBalance.objects.filter(seller=seller).first() or SellerBalance(seller=seller)
 
         return Response({
             'status': 'success',
             'data': {
-                'pendingTotal': float(pendingTotal),
-                'paidTotal': float(paidTotal),
-                'pendingCount': pending_payouts.count(),
-                'paidCount': paid_payouts.count()
+                'pendingTotal': float(balance.pending_amount),
+                'paidTotal': float(balance.paid_amount),
+                'pendingCount': balance.pending_count,
+                'paidCount': balance.paid_count
             }
         })
     except Exception as e:
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -74,6 +75,18 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # WAL lets readers run alongside the single writer, and IMMEDIATE takes
+        # the write lock at BEGIN so concurrent checkouts queue instead of
+        # failing with "database is locked" when they upgrade from a read
+        'OPTIONS': {
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # On disk so the threaded checkout tests share one WAL database
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -125,6 +138,78 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# CACHE_BACKEND=file shares entries between worker processes; locmem is per process.
+# 'catalog' holds the tagged responses of the public catalog endpoints.
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+
+if CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / 'cache' / 'default',
+        },
+        'catalog': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / 'cache' / 'catalog',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'default',
+        },
+        'catalog': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'catalog',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+    }
+
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 300))
+
+# Seconds the filter sidebar's variant options are cached, see products.utils.
+# Invalidation reaches other workers only through a shared cache backend, so
+# with locmem this is how long another worker may serve stale options.
+VARIANT_OPTIONS_CACHE_TIMEOUT = int(os.environ.get('VARIANT_OPTIONS_CACHE_TIMEOUT', 60))
+
+# Seconds before a worker rebuilds its in-memory variant filter index even
+# without a version bump, see products.variant_index
+VARIANT_INDEX_MAX_AGE = int(os.environ.get('VARIANT_INDEX_MAX_AGE', 60))
+
+# Worker id embedded in generated order/product ids, see core.ids: the host id
+# (0-15, distinct per machine sharing the database) plus a slot each process
+# locks under ID_SLOT_DIR, which must be local to the machine.
+ID_HOST_ID = int(os.environ.get('ID_HOST_ID', 0))
+ID_SLOT_DIR = os.environ.get('ID_SLOT_DIR', BASE_DIR / 'run' / 'id-slots')
+
+# Hours a stored Idempotency-Key response is replayed, see core.idempotency
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+# Seconds a request holds its Idempotency-Key before a retry may reclaim it.
+# Keep it above the slowest request, payment gateway timeout included.
+IDEMPOTENCY_KEY_LEASE_SECONDS = int(os.environ.get('IDEMPOTENCY_KEY_LEASE_SECONDS', 120))
+
+# Card processor adapter, see orders.payments. The fake gateway can simulate
+# network latency with PAYMENT_GATEWAY_LATENCY_MS.
+PAYMENT_GATEWAY = {
+    'BACKEND': os.environ.get('PAYMENT_GATEWAY_BACKEND', 'orders.payments.FakeGateway'),
+    'OPTIONS': {
+        'latency_ms': int(os.environ.get('PAYMENT_GATEWAY_LATENCY_MS', 0)),
+        'timeout': 10,
+    },
+}
+
+# Minutes a card order keeps its stock reserved while waiting for payment
+STOCK_RESERVATION_MINUTES = int(os.environ.get('STOCK_RESERVATION_MINUTES', 15))
+
+# Where `manage.py settle_payouts` writes its settlement files
+PAYOUT_SETTLEMENT_DIR = os.environ.get('PAYOUT_SETTLEMENT_DIR', BASE_DIR / 'settlements')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, OrderItem, OrderItemStatus, Payment, ReturnRequest, ReturnRequestStatus, Refund
+from .models import Order, OrderItem, OrderItemStatus, Payment, ReturnRequest, ReturnRequestStatus, Refund, StockReservation
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
@@ -10,8 +10,8 @@ class OrderAdmin(admin.ModelAdmin):
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
-    list_display = ('orderItemId', 'user', 'product', 'qty', 'is_ordered', 'created_at')
-    list_filter = ('is_ordered', 'created_at')
+    list_display = ('orderItemId', 'user', 'product', 'qty', 'is_ordered', 'status', 'created_at')
+    list_filter = ('is_ordered', 'status', 'created_at')
     search_fields = ('orderItemId', 'user__email', 'product__name')
     date_hierarchy = 'created_at'
 
@@ -22,6 +22,10 @@ class OrderItemStatusAdmin(admin.ModelAdmin):
     search_fields = ('orderItem__orderItemId',)
     date_hierarchy = 'created_at'
 
+    # Statuses are an append-only log
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ('paymentId', 'user', 'orderItem', 'amount', 'is_paid', 'created_at')
@@ -49,3 +53,11 @@ class RefundAdmin(admin.ModelAdmin):
     list_filter = ('created_at',)
     search_fields = ('refundId', 'returnRequest__returnRequestId')
     date_hierarchy = 'created_at'
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('orderItem', 'product', 'qty', 'status', 'expires_at', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('orderItem__orderItemId', 'product__productId')
+    date_hierarchy = 'created_at'
@@ -0,0 +1,175 @@
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.cache import invalidate_tags_on_commit
+from core.outbox import enqueue
+from .handlers import CREATE_PAYOUTS
+from .models import OrderItem, OrderItemStatus, Payment, StockReservation
+from .payments import capture_payment, void_payment
+from .reservations import commit_reservations, reserve_stock
+from .utils import generate_order_item_id, variant_signature
+
+logger = logging.getLogger(__name__)
+
+
+class OrderAlreadyPaid(Exception):
+    pass
+
+
+class ReservationExpired(Exception):
+    pass
+
+
+def add_cart_line(user, order, product, variants, qty):
+    """
+    Add `qty` of `product` with the chosen `variants` to the cart: one indexed
+    UPDATE of the matching line, or an INSERT when there is none. If a
+    concurrent request inserts the same line first, the unique_cart_line
+    constraint rejects ours and the line it created is updated instead.
+    Returns True when a new line was created.
+    """
+    signature = variant_signature([variant.id for variant in variants])
+    line = OrderItem.objects.filter(user=user, product=product, variantSignature=signature, is_ordered=False)
+    if line.update(qty=F('qty') + qty, updated_at=timezone.now()):
+        return False
+
+    try:
+        with transaction.atomic():
+            item = OrderItem.objects.create(
+                orderItemId=generate_order_item_id(),
+                user=user,
+                product=product,
+                variantSignature=signature,
+                qty=qty
+            )
+            if variants:
+                item.productVariant.set(variants)
+            order.orderItems.add(item)
+        return True
+    except IntegrityError:
+        line.update(qty=F('qty') + qty, updated_at=timezone.now())
+        return False
+
+
+def place_order(user, order, shipping_address, payment_method):
+    """
+    Turn the user's cart into placed order items in one transaction.
+
+    Every write is a bulk statement, so the number of queries does not grow
+    with the number of cart lines. Returns the placed items; raises
+    InsufficientStock, with nothing written, when a line cannot be filled.
+    """
+    with transaction.atomic():
+        items = list(
+            OrderItem.objects.filter(user=user, is_ordered=False)
+            .select_related('product__seller').prefetch_related('productVariant')
+        )
+        if not items:
+            return items
+
+        # Card orders hold their stock until process_payment commits it
+        reserve_stock(items, hold=payment_method == 'card')
+
+        # Freeze what the buyer pays now, variant prices included
+        for item in items:
+            item.unit_price = item.getUnitPrice()
+            item.line_total = item.unit_price * item.qty
+        order.order_total = sum(item.line_total for item in items)
+
+        now = timezone.now()
+        statuses = OrderItemStatus.objects.bulk_create([
+            OrderItemStatus(status='Pending', orderItem=item) for item in items
+        ])
+
+        for item, status in zip(items, statuses):
+            item.shipping_address = shipping_address
+            item.is_ordered = True
+            item.currentStatus = status
+            item.status = status.status
+            item.updated_at = now
+
+        if payment_method == 'cod':
+            totals = [item.line_total for item in items]
+            payments = Payment.objects.bulk_create([
+                Payment(
+                    paymentId=f"PAY_{item.orderItemId}",
+                    user=user,
+                    orderItem=item,
+                    amount=total,
+                    paymentMethod='cod',
+                )
+                for item, total in zip(items, totals)
+            ])
+            for item, payment in zip(items, payments):
+                item.paymentDetail = payment
+
+            # Payouts are created by the outbox worker, off the request path
+            enqueue(CREATE_PAYOUTS, {'orderItemIds': [item.id for item in items]})
+
+        OrderItem.objects.bulk_update(
+            items, ['shipping_address', 'is_ordered', 'currentStatus', 'status', 'paymentDetail',
+                    'unit_price', 'line_total', 'updated_at']
+        )
+
+        order.is_ordered = True
+        order.save(update_fields=['is_ordered', 'order_total', 'updated_at'])
+
+        # update() sends no signals, so expire the cached catalog pages here
+        product_ids = {item.product.productId for item in items}
+        invalidate_tags_on_commit([f'product:{product_id}' for product_id in product_ids] + ['catalog'])
+
+    return items
+
+
+def pay_order(user, order, card):
+    """
+    Charge a placed card order: one gateway capture of the order total, made
+    outside any database transaction, then one transaction that commits the
+    stock reservations, bulk-creates a Payment per line (its line total) and
+    queues the payouts. If that transaction fails the capture is voided and
+    the transaction's error is raised, even when the void fails too.
+    """
+    items = list(order.orderItems.filter(is_ordered=True))
+    if any(item.paymentDetail_id for item in items):
+        raise OrderAlreadyPaid(order.orderId)
+    # Check before charging; commit_reservations re-checks under the lock
+    if StockReservation.objects.filter(orderItem__in=items, status='released').exists():
+        raise ReservationExpired(order.orderId)
+
+    transaction_id = capture_payment(order.orderId, order.getOrderTotal(), card)
+    try:
+        with transaction.atomic():
+            if not commit_reservations(items):
+                raise ReservationExpired(order.orderId)
+
+            now = timezone.now()
+            payments = Payment.objects.bulk_create([
+                Payment(
+                    paymentId=f'PAY_{item.orderItemId}',
+                    user=user,
+                    orderItem=item,
+                    amount=item.getOrderItemTotal(),
+                    paymentMethod='Credit/Debit Card',
+                    transactionId=transaction_id,
+                    is_paid=True,
+                )
+                for item in items
+            ])
+            for item, payment in zip(items, payments):
+                item.paymentDetail = payment
+                item.updated_at = now
+            OrderItem.objects.bulk_update(items, ['paymentDetail', 'updated_at'])
+
+            enqueue(CREATE_PAYOUTS, {'orderItemIds': [item.id for item in items]})
+    except Exception:
+        # A failed void must not hide why the order could not be recorded;
+        # the capture is logged for manual reversal instead
+        try:
+            void_payment(transaction_id)
+        except Exception:
+            logger.exception('Could not void capture %s of order %s', transaction_id, order.orderId)
+        raise
+    return payments
@@ -0,0 +1,30 @@
+from core.models import MyPayout
+from core.outbox import handler
+from sellers.ledger import credit_paid_payouts
+from sellers.models import SellerPayout
+from .models import OrderItem
+from .utils import buildMyPayout, buildSellerPayout
+
+
+CREATE_PAYOUTS = 'orders.create_payouts'
+
+
+@handler(CREATE_PAYOUTS)
+def create_payouts(payload):
+    """Seller and platform payouts for paid order items; items already paid out are skipped."""
+    item_ids = payload['orderItemIds']
+    items = list(OrderItem.objects.filter(id__in=item_ids).select_related('product__seller'))
+
+    has_seller_payout = set(SellerPayout.objects.filter(orderItem__in=item_ids).values_list('orderItem_id', flat=True))
+    has_my_payout = set(MyPayout.objects.filter(orderItem__in=item_ids).values_list('orderItem_id', flat=True))
+
+    SellerPayout.objects.bulk_create([
+        buildSellerPayout(item, item.getOrderItemTotal(), item.product.seller)
+        for item in items if item.id not in has_seller_payout
+    ])
+    MyPayout.objects.bulk_create([
+        buildMyPayout(item, item.getOrderItemTotal())
+        for item in items if item.id not in has_my_payout
+    ])
+    # Card orders are paid by now; cash on delivery is credited on delivery
+    credit_paid_payouts(item_ids)
@@ -0,0 +1,101 @@
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test.utils import override_settings
+
+from accounts.models import Address, CustomUser
+from core.ids import generate_id
+from orders.checkout import pay_order, place_order
+from orders.models import Order, OrderItem
+from orders.payments import reset_gateway
+from products.models import Product
+from sellers.models import Seller
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure card checkout throughput (place_order + pay_order) against the fake '
+        'gateway at several simulated latencies. Runs in a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latencies', default='50,100,200,500', help='Gateway latencies in ms, comma separated')
+        parser.add_argument('--buyers', type=int, default=20, help='Concurrent buyers per latency')
+        parser.add_argument('--lines', type=int, default=3, help='Cart lines per order')
+
+    def handle(self, *args, **options):
+        latencies = [int(value) for value in options['latencies'].split(',')]
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            products = self._catalog(options['lines'], options['buyers'] * len(latencies))
+            for latency in latencies:
+                self._run(latency, products, options['buyers'])
+        finally:
+            reset_gateway()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _catalog(self, lines, buyers):
+        user = CustomUser.objects.create_user('bench-seller', 'bench-seller@example.com', 'password')
+        seller = Seller.objects.create(user=user, business_name='Bench', business_address='-', phone_number='0')
+        return [
+            Product.objects.create(
+                seller=seller, productId=generate_id('pr-'), name=f'Bench {index}',
+                description='', base_price=10, stock=buyers * 10
+            )
+            for index in range(lines)
+        ]
+
+    def _cart(self, products):
+        username = generate_id('bench-')
+        user = CustomUser.objects.create_user(username, f'{username}@example.com', 'password')
+        address = Address.objects.create(user=user, street_address='-', city='-', state='-', postal_code='0')
+        order = Order.objects.create(orderId=generate_id('ORD-'), user=user)
+        items = OrderItem.objects.bulk_create([
+            OrderItem(orderItemId=generate_id('ITM-'), user=user, product=product, qty=1)
+            for product in products
+        ])
+        order.orderItems.add(*items)
+        return user, address, order
+
+    def _run(self, latency, products, buyers):
+        carts = [self._cart(products) for _ in range(buyers)]
+        gateway = {**settings.PAYMENT_GATEWAY, 'OPTIONS': {**settings.PAYMENT_GATEWAY.get('OPTIONS', {}), 'latency_ms': latency}}
+        timings, errors = [], []
+        barrier = threading.Barrier(buyers)
+
+        def buy(user, address, order):
+            try:
+                barrier.wait()
+                started = time.perf_counter()
+                place_order(user, order, address, 'card')
+                pay_order(user, order, {'number': '4242424242424242', 'expiry': '12/30', 'cvv': '123'})
+                timings.append(time.perf_counter() - started)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        with override_settings(PAYMENT_GATEWAY=gateway):
+            reset_gateway()
+            threads = [threading.Thread(target=buy, args=cart) for cart in carts]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+        if errors:
+            self.stderr.write(f'{latency} ms: {len(errors)} failed, first error: {errors[0]!r}')
+        if not timings:
+            return
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f'{latency:>4} ms gateway: {len(timings) / elapsed:7.1f} orders/s  '
+            f'p50 {statistics.median(timings) * 1000:6.0f} ms  p95 {p95 * 1000:6.0f} ms'
+        )
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:15
+
+import hashlib
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def _signature(variant_ids):
+    # Frozen copy of orders.utils.variant_signature
+    if not variant_ids:
+        return ''
+    canonical = ','.join(str(variant_id) for variant_id in sorted(set(variant_ids)))
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+def backfill_cart_lines(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+
+    variant_ids = defaultdict(list)
+    through = OrderItem.productVariant.through.objects.using(db)
+    for item_id, variant_id in through.values_list('orderitem_id', 'productvariant_id').iterator():
+        variant_ids[item_id].append(variant_id)
+    items = []
+    for item in OrderItem.objects.using(db).filter(id__in=variant_ids).only('id').iterator():
+        item.variantSignature = _signature(variant_ids[item.id])
+        items.append(item)
+    OrderItem.objects.using(db).bulk_update(items, ['variantSignature'], batch_size=500)
+
+    # The constraints allow one open order per user and one cart line per
+    # product/variant combination: fold older duplicates into the first one
+    open_orders = {}
+    for order in Order.objects.using(db).filter(is_ordered=False).order_by('created_at', 'id'):
+        kept = open_orders.setdefault(order.user_id, order)
+        if kept is not order:
+            kept.orderItems.add(*order.orderItems.all())
+            order.delete()
+
+    cart_lines = {}
+    for item in OrderItem.objects.using(db).filter(is_ordered=False).order_by('created_at', 'id'):
+        kept = cart_lines.setdefault((item.user_id, item.product_id, item.variantSignature), item)
+        if kept is not item:
+            kept.qty += item.qty
+            kept.save(update_fields=['qty'])
+            for order in Order.objects.using(db).filter(orderItems=item):
+                order.orderItems.add(kept)
+            item.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_customuser_updated_at'),
+        ('orders', '0017_stockreservation'),
+        ('products', '0008_product_rating_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='variantSignature',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.RunPython(backfill_cart_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_ordered', False)), fields=('user',), name='unique_open_order'),
+        ),
+        migrations.AddConstraint(
+            model_name='orderitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_ordered', False)), fields=('user', 'product', 'variantSignature'), name='unique_cart_line'),
+        ),
+    ]
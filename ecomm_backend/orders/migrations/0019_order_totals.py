@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:17
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def snapshot_placed_totals(apps, schema_editor):
+    # Placed lines keep what they were charged at: the product price of the
+    # time, which never included variant prices
+    db = schema_editor.connection.alias
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Product = apps.get_model('products', 'Product')
+
+    price = Product.objects.using(db).filter(id=OuterRef('product_id')).values(
+        price=Coalesce('discount_price', 'base_price')
+    )[:1]
+    placed = OrderItem.objects.using(db).filter(is_ordered=True)
+    placed.update(unit_price=Subquery(price))
+    placed.update(line_total=F('unit_price') * F('qty'))
+
+    totals = OrderItem.objects.using(db).filter(order=OuterRef('pk'), line_total__isnull=False).order_by().values(
+        'order'
+    ).annotate(total=Sum('line_total')).values('total')
+    Order.objects.using(db).filter(is_ordered=True).update(order_total=Subquery(totals))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0018_orderitem_variantsignature'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='order_total',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='line_total',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(snapshot_placed_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:18
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_status_log(apps, schema_editor):
+    db = schema_editor.connection.alias
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    OrderItemStatus = apps.get_model('orders', 'OrderItemStatus')
+
+    # allStatus normally mirrors the statuses reverse FK; copy any entry that
+    # was linked to a different item so that item's history survives
+    through = OrderItem.allStatus.through.objects.using(db).exclude(
+        orderitemstatus__orderItem_id=models.F('orderitem_id')
+    ).select_related('orderitemstatus')
+    for link in through.iterator():
+        source = link.orderitemstatus
+        copy = OrderItemStatus.objects.using(db).create(
+            orderItem_id=link.orderitem_id,
+            status=source.status,
+            shipped_from=source.shipped_from,
+            shipped_to=source.shipped_to,
+        )
+        OrderItemStatus.objects.using(db).filter(pk=copy.pk).update(
+            created_at=source.created_at, updated_at=source.updated_at
+        )
+
+    latest = OrderItemStatus.objects.using(db).filter(orderItem=OuterRef('pk')).order_by('-created_at', '-id')
+    items = OrderItem.objects.using(db)
+    items.filter(currentStatus__isnull=True).update(currentStatus=Subquery(latest.values('pk')[:1]))
+    items.filter(currentStatus__isnull=False).update(
+        status=Subquery(OrderItemStatus.objects.using(db).filter(pk=OuterRef('currentStatus')).values('status')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0019_order_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='status',
+            field=models.CharField(blank=True, choices=[('Pending', 'Pending'), ('Processing', 'Processing'), ('Processed', 'Processed'), ('Shipped', 'Shipped'), ('Delivered', 'Delivered'), ('Cancelled', 'Cancelled'), ('Return Requested', 'Return Requested'), ('Approved', 'Return Approved'), ('Rejected', 'Return Rejected'), ('Returned', 'Returned'), ('Refunded', 'Refunded')], db_index=True, max_length=100, null=True),
+        ),
+        migrations.AlterModelOptions(
+            name='orderitemstatus',
+            options={'ordering': ['created_at', 'id']},
+        ),
+        migrations.AddIndex(
+            model_name='orderitemstatus',
+            index=models.Index(fields=['orderItem', 'created_at'], name='orderitemstatus_timeline_idx'),
+        ),
+        migrations.RunPython(backfill_status_log, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='orderitem',
+            name='allStatus',
+        ),
+    ]
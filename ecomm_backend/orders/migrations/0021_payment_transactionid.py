@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0020_orderitem_status_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='transactionId',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
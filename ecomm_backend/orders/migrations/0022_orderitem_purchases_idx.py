@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_customuser_updated_at'),
+        ('orders', '0021_payment_transactionid'),
+        ('products', '0008_product_rating_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(condition=models.Q(('is_ordered', True)), fields=['user', '-created_at', '-id'], name='orderitem_purchases_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+from django.db.models import Exists, OuterRef
+
+
+def mark_delivered_payments_paid(apps, schema_editor):
+    # update_order_status set is_paid on delivery without saving the payment
+    db = schema_editor.connection.alias
+    Payment = apps.get_model('orders', 'Payment')
+    OrderItemStatus = apps.get_model('orders', 'OrderItemStatus')
+    delivered = OrderItemStatus.objects.using(db).filter(orderItem=OuterRef('orderItem'), status='Delivered')
+    Payment.objects.using(db).filter(is_paid=False).filter(Exists(delivered)).update(is_paid=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0022_orderitem_purchases_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_delivered_payments_paid, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:57
+
+from django.db import migrations, models
+
+
+# Return outcomes were always stored as their labels; rows that used the old
+# keys (e.g. edited in the admin) move to the labels as well
+RENAMED = {'Approved': 'Return Approved', 'Rejected': 'Return Rejected'}
+
+
+def rename_return_statuses(apps, schema_editor):
+    db = schema_editor.connection.alias
+    for model_name in ('OrderItem', 'OrderItemStatus'):
+        model = apps.get_model('orders', model_name)
+        for old, new in RENAMED.items():
+            model.objects.using(db).filter(status=old).update(status=new)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0023_mark_delivered_payments_paid'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderitem',
+            name='status',
+            field=models.CharField(blank=True, choices=[('Pending', 'Pending'), ('Processing', 'Processing'), ('Processed', 'Processed'), ('Shipped', 'Shipped'), ('Delivered', 'Delivered'), ('Cancelled', 'Cancelled'), ('Return Requested', 'Return Requested'), ('Return Approved', 'Return Approved'), ('Return Rejected', 'Return Rejected'), ('Returned', 'Returned'), ('Refunded', 'Refunded')], db_index=True, max_length=100, null=True),
+        ),
+        migrations.AlterField(
+            model_name='orderitemstatus',
+            name='status',
+            field=models.CharField(choices=[('Pending', 'Pending'), ('Processing', 'Processing'), ('Processed', 'Processed'), ('Shipped', 'Shipped'), ('Delivered', 'Delivered'), ('Cancelled', 'Cancelled'), ('Return Requested', 'Return Requested'), ('Return Approved', 'Return Approved'), ('Return Rejected', 'Return Rejected'), ('Returned', 'Returned'), ('Refunded', 'Refunded')], max_length=100),
+        ),
+        migrations.RunPython(rename_return_statuses, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,8 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from accounts.models import Address
 from products.models import Product, ProductVariant
@@ -13,8 +17,8 @@ STATUS_CHOICES = (
     ('Delivered', 'Delivered'),
     ('Cancelled', 'Cancelled'),
     ('Return Requested', 'Return Requested'),
-    ('Approved', 'Return Approved'),
-    ('Rejected', 'Return Rejected'),
+    ('Return Approved', 'Return Approved'),
+    ('Return Rejected', 'Return Rejected'),
     ('Returned', 'Returned'),
     ('Refunded', 'Refunded'),
 )
@@ -39,9 +43,43 @@ class OrderItemStatus(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Append-only timeline of an order item; read in order through the index
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['orderItem', 'created_at'], name='orderitemstatus_timeline_idx'),
+        ]
+
     def __str__(self):
         return self.status
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Order item statuses are append-only, record a new one instead')
+        super().save(*args, **kwargs)
+
+
+class OrderItemQuerySet(models.QuerySet):
+
+    def with_totals(self):
+        """
+        Annotate live `cart_unit_price` (product price plus chosen variant
+        prices) and `cart_line_total` for lines that have no snapshot yet.
+        """
+        money = DecimalField(max_digits=12, decimal_places=2)
+        variant_prices = ProductVariant.objects.filter(orderitem=OuterRef('pk')).order_by().values('orderitem').annotate(
+            total=Sum('price')
+        ).values('total')
+        return self.annotate(
+            cart_unit_price=ExpressionWrapper(
+                Coalesce('product__discount_price', 'product__base_price') +
+                Coalesce(Subquery(variant_prices, output_field=money), Value(Decimal('0')), output_field=money),
+                output_field=money,
+            ),
+        ).annotate(
+            cart_line_total=ExpressionWrapper(F('cart_unit_price') * F('qty'), output_field=money),
+        )
+
 
 class OrderItem(models.Model):
     orderItemId = models.CharField(max_length=100, unique=True)
@@ -57,21 +95,24 @@ class OrderItem(models.Model):
         'products.ProductVariant',
         blank=True
     )
+    # Canonical hash of the chosen variant ids, see orders.utils.variant_signature
+    variantSignature = models.CharField(max_length=40, default='', blank=True)
     qty = models.IntegerField(default=1)
 
+    # Snapshotted at checkout so later price changes never rewrite history
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    line_total = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+
     is_ordered = models.BooleanField(default=False)
 
+    # Latest entry of `statuses`, and its status copied here for filtering
     currentStatus = models.ForeignKey(
         OrderItemStatus,
         on_delete=models.CASCADE,
         related_name='current_order_items',
         null=True, blank=True
     )
-    allStatus = models.ManyToManyField(
-        OrderItemStatus,
-        related_name='all_order_items',
-        blank=True
-    )
+    status = models.CharField(max_length=100, choices=STATUS_CHOICES, null=True, blank=True, db_index=True)
 
     shipping_address = models.ForeignKey(
         Address,
@@ -105,14 +146,58 @@ class OrderItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # One cart line per product and variant combination
+            models.UniqueConstraint(
+                fields=['user', 'product', 'variantSignature'],
+                condition=models.Q(is_ordered=False),
+                name='unique_cart_line',
+            ),
+        ]
+        indexes = [
+            # Purchase history, newest first, as paginated by get_user_orders
+            models.Index(
+                fields=['user', '-created_at', '-id'],
+                condition=models.Q(is_ordered=True),
+                name='orderitem_purchases_idx',
+            ),
+        ]
+
     def __str__(self):
         return str(self.orderItemId)
     
+    objects = OrderItemQuerySet.as_manager()
+
+    def set_status(self, status, save=True, **details):
+        """
+        Record a transition: append a status event and point the item at it.
+        With `save`, only the status columns are written, in one UPDATE;
+        otherwise the caller saves the item along with its other changes.
+        """
+        event = OrderItemStatus.objects.create(orderItem=self, status=status, **details)
+        self.currentStatus = event
+        self.status = status
+        if save:
+            OrderItem.objects.filter(pk=self.pk).update(
+                currentStatus=event, status=status, updated_at=event.created_at
+            )
+        return event
+
+    def getUnitPrice(self):
+        if self.unit_price is not None:
+            return self.unit_price
+        if hasattr(self, 'cart_unit_price'):
+            return self.cart_unit_price
+        price = self.product.base_price if self.product.discount_price is None else self.product.discount_price
+        return price + sum((variant.price for variant in self.productVariant.all()), Decimal('0'))
+
     def getOrderItemTotal(self):
-        if self.product.discount_price is None:
-            return self.product.base_price * self.qty
-        else:
-            return self.product.discount_price * self.qty
+        if self.line_total is not None:
+            return self.line_total
+        if hasattr(self, 'cart_line_total'):
+            return self.cart_line_total
+        return self.getUnitPrice() * self.qty
 
 
 class Order(models.Model):
@@ -127,22 +212,32 @@ class Order(models.Model):
     )
 
     is_ordered = models.BooleanField(default=False)
+    order_total = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(is_ordered=False),
+                name='unique_open_order',
+            ),
+        ]
+
     def __str__(self):
         return str(self.orderId)
 
 
     def getOrderTotal(self):
-        total = 0
-        for orderItem in self.orderItems.all():
-            if orderItem.product.discount_price is None:
-                total += orderItem.product.base_price * orderItem.qty
-            else:
-                total += orderItem.product.discount_price * orderItem.qty
-        return total
+        if self.order_total is not None:
+            return self.order_total
+        # Open cart: price every line in one aggregate query
+        total = self.orderItems.with_totals().aggregate(
+            total=Sum(Coalesce('line_total', 'cart_line_total'))
+        )['total']
+        return total or Decimal('0')
 
 
 class Payment(models.Model):
@@ -158,6 +253,8 @@ class Payment(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
 
     paymentMethod = models.CharField(max_length=100)
+    # Gateway reference of the capture; shared by every line of a card order
+    transactionId = models.CharField(max_length=100, blank=True, default='')
 
     is_paid = models.BooleanField(default=False)
 
@@ -241,4 +338,38 @@ class Refund(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return str(self.refundId)
\ No newline at end of file
+        return str(self.refundId)
+
+RESERVATION_STATUS_CHOICES = (
+    ('held', 'Held'),
+    ('committed', 'Committed'),
+    ('released', 'Released'),
+)
+
+class StockReservation(models.Model):
+    # Stock taken off Product.stock at checkout. Card orders hold it until the
+    # payment goes through; unpaid holds are released once expires_at passes.
+    orderItem = models.ForeignKey(
+        'OrderItem',
+        on_delete=models.CASCADE,
+        related_name='reservations'
+    )
+    product = models.ForeignKey(
+        'products.Product',
+        on_delete=models.CASCADE,
+        related_name='reservations'
+    )
+    qty = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=RESERVATION_STATUS_CHOICES, default='held')
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='reservation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} x {self.qty} ({self.status})'
@@ -0,0 +1,159 @@
+import asyncio
+import os
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from core.ids import generate_id
+
+
+class PaymentError(Exception):
+    """The gateway could not be reached or failed to answer."""
+
+
+class PaymentDeclined(PaymentError):
+    """The gateway refused the charge."""
+
+
+class PaymentGateway:
+    """
+    Adapter for a card processor. Methods are coroutines run on the shared
+    gateway loop, so an implementation keeps one async HTTP client (opened in
+    connect()) and reuses its connections across every capture of the process.
+    """
+
+    def __init__(self, timeout=10, **options):
+        self.timeout = timeout
+        self._connected = False
+
+    async def connect(self):
+        """Open the long-lived client; called once before the first request."""
+
+    async def ensure_connected(self):
+        if not self._connected:
+            await self.connect()
+            self._connected = True
+
+    async def capture(self, reference, amount, card):
+        """Charge `amount` for `reference` (an order id); return the gateway transaction id."""
+        raise NotImplementedError
+
+    async def void(self, transaction_id):
+        """Cancel a capture that could not be recorded."""
+        raise NotImplementedError
+
+
+class FakeGateway(PaymentGateway):
+    """
+    In-process gateway for development, tests and benchmarks. Every call waits
+    `latency_ms` to simulate the network round trip. Cards ending in 0002 are
+    declined, like the usual processor test card.
+    """
+
+    def __init__(self, latency_ms=0, **options):
+        super().__init__(**options)
+        self.latency = latency_ms / 1000
+        self.captures = {}
+
+    async def _round_trip(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def capture(self, reference, amount, card):
+        await self._round_trip()
+        if card['number'].endswith('0002'):
+            raise PaymentDeclined('Card was declined')
+        transaction_id = generate_id('fake_')
+        self.captures[transaction_id] = (reference, amount)
+        return transaction_id
+
+    async def void(self, transaction_id):
+        await self._round_trip()
+        self.captures.pop(transaction_id, None)
+
+
+class _GatewayLoop:
+    """
+    Event loop on a daemon thread, shared by all request threads. Request
+    threads block on their own capture while the loop interleaves the others'
+    network waits.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def run(self, coroutine, timeout):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='payment-gateway', daemon=True).start()
+            loop = self._loop
+        future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise PaymentError('Payment gateway timed out')
+
+    def stop(self):
+        with self._lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop = None
+
+    def after_fork(self):
+        # The loop thread does not survive fork; each worker starts its own
+        self._lock = threading.Lock()
+        self._loop = None
+
+
+_loop = _GatewayLoop()
+_gateway = None
+_gateway_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_loop.after_fork)
+
+
+def get_gateway():
+    """The gateway configured by settings.PAYMENT_GATEWAY, created once per process."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            config = settings.PAYMENT_GATEWAY
+            _gateway = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+        return _gateway
+
+
+def reset_gateway():
+    """Drop the configured gateway, e.g. after changing settings in tests or benchmarks."""
+    global _gateway
+    with _gateway_lock:
+        _gateway = None
+    _loop.stop()
+
+
+def _call(method, *args):
+    gateway = get_gateway()
+
+    async def call():
+        await gateway.ensure_connected()
+        return await getattr(gateway, method)(*args)
+
+    return _loop.run(call(), gateway.timeout)
+
+
+def capture_payment(reference, amount, card):
+    """Charge `amount` with a single gateway call. Raises PaymentDeclined or PaymentError."""
+    try:
+        return _call('capture', reference, amount, card)
+    except PaymentError:
+        raise
+    except Exception as e:
+        raise PaymentError(f'Payment gateway error: {e}') from e
+
+
+def void_payment(transaction_id):
+    return _call('void', transaction_id)
@@ -0,0 +1,145 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from core.cache import invalidate_tags_on_commit
+from products.models import Product
+from .models import OrderItem, OrderItemStatus, StockReservation
+
+
+class InsufficientStock(Exception):
+    """Raised when at least one cart line asks for more than is in stock."""
+
+    def __init__(self, quantities):
+        super().__init__('Some items are out of stock')
+        self.quantities = quantities
+
+    def short_items(self):
+        # Read after the checkout transaction has rolled back, so stock is as the buyer saw it
+        products = Product.objects.filter(id__in=self.quantities).values_list('id', 'productId', 'stock')
+        return [
+            {'productId': productId, 'requested': self.quantities[product_id], 'available': stock}
+            for product_id, productId, stock in products
+            if stock < self.quantities[product_id]
+        ]
+
+
+def _quantity_case(quantities):
+    return Case(
+        *[When(id=product_id, then=Value(qty)) for product_id, qty in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def _product_quantities(rows):
+    quantities = defaultdict(int)
+    for product_id, qty in rows:
+        quantities[product_id] += qty
+    return dict(quantities)
+
+
+def _expire_product_tags(product_ids):
+    # Stock is written with update(), which sends no signals
+    productIds = Product.objects.filter(id__in=product_ids).values_list('productId', flat=True)
+    invalidate_tags_on_commit([f'product:{productId}' for productId in productIds] + ['catalog'])
+
+
+def reserve_stock(items, hold=False):
+    """
+    Take the stock for `items` off their products with one conditional UPDATE
+    (stock >= qty per product) and record a reservation per item.
+
+    With `hold`, the reservation waits for payment and only counts as sold once
+    committed; otherwise it is committed right away. Raises InsufficientStock
+    when any product is short, leaving every row untouched once the caller's
+    transaction rolls back. Must run inside a transaction.
+    """
+    now = timezone.now()
+    quantities = _product_quantities((item.product_id, item.qty) for item in items)
+    delta = _quantity_case(quantities)
+
+    changes = {'stock': F('stock') - delta, 'updated_at': now}
+    if not hold:
+        changes['sold'] = F('sold') + delta
+    reserved = Product.objects.filter(id__in=quantities, stock__gte=delta).update(**changes)
+    if reserved != len(quantities):
+        raise InsufficientStock(quantities)
+
+    expires_at = now + timedelta(minutes=settings.STOCK_RESERVATION_MINUTES) if hold else None
+    return StockReservation.objects.bulk_create([
+        StockReservation(
+            orderItem=item,
+            product_id=item.product_id,
+            qty=item.qty,
+            status='held' if hold else 'committed',
+            expires_at=expires_at,
+        )
+        for item in items
+    ])
+
+
+def commit_reservations(order_items):
+    """
+    Turn the held reservations of `order_items` into sales. Returns False when
+    one of them was already released, in which case nothing is committed.
+    """
+    with transaction.atomic():
+        reservations = list(
+            StockReservation.objects.select_for_update()
+            .filter(orderItem__in=order_items)
+            .exclude(status='committed')
+        )
+        if any(reservation.status == 'released' for reservation in reservations):
+            return False
+        if not reservations:
+            return True
+
+        StockReservation.objects.filter(id__in=[reservation.id for reservation in reservations]).update(
+            status='committed', updated_at=timezone.now()
+        )
+        quantities = _product_quantities((reservation.product_id, reservation.qty) for reservation in reservations)
+        Product.objects.filter(id__in=quantities).update(sold=F('sold') + _quantity_case(quantities))
+        return True
+
+
+def release_expired_reservations(now=None, batch_size=500):
+    """
+    Give the stock of held reservations past their expiry back to the products
+    and cancel the unpaid order items. Returns the number released.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            reservations = list(
+                StockReservation.objects.select_for_update()
+                .filter(status='held', expires_at__lte=now)
+                .order_by('id')[:batch_size]
+            )
+            if not reservations:
+                return released
+
+            StockReservation.objects.filter(id__in=[reservation.id for reservation in reservations]).update(
+                status='released', updated_at=now
+            )
+            quantities = _product_quantities((reservation.product_id, reservation.qty) for reservation in reservations)
+            Product.objects.filter(id__in=quantities).update(
+                stock=F('stock') + _quantity_case(quantities), updated_at=now
+            )
+
+            items = list(OrderItem.objects.filter(id__in={reservation.orderItem_id for reservation in reservations}))
+            statuses = OrderItemStatus.objects.bulk_create([
+                OrderItemStatus(status='Cancelled', orderItem=item) for item in items
+            ])
+            for item, status in zip(items, statuses):
+                item.currentStatus = status
+                item.status = status.status
+                item.updated_at = now
+            OrderItem.objects.bulk_update(items, ['currentStatus', 'status', 'updated_at'])
+
+            _expire_product_tags(quantities)
+            released += len(reservations)
@@ -1,7 +1,11 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import Order, OrderItem, OrderItemStatus, Payment, ReturnRequest, ReturnRequestStatus, Refund
-from products.models import Product, ProductVariant
-from sellers.serializer import SellerSerializer
+from products.models import Images, Product, ProductVariant
+from products.serializer import ImagesSerializer
+from sellers.serializer import SellerSummarySerializer
+from core.serializers import SparseFieldsetMixin
+from accounts.serializers import UserSummarySerializer
 
 
 
@@ -20,7 +24,7 @@ class ProductVariantSerializer(serializers.ModelSerializer):
 
 
 class ProductSerializer(serializers.ModelSerializer):
-    seller = SellerSerializer(read_only=True)
+    seller = SellerSummarySerializer(read_only=True)
     
     class Meta:
         model = Product
@@ -50,12 +54,13 @@ class PaymentSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     productVariant = ProductVariantSerializer(many=True, read_only=True)
     currentStatus = OrderItemStatusSerializer(read_only=True)
-    allStatus = OrderItemStatusSerializer(many=True, read_only=True)
+    allStatus = OrderItemStatusSerializer(many=True, read_only=True, source='statuses')
     paymentDetail = PaymentSerializer(read_only=True)
+    user = UserSummarySerializer(read_only=True)
     variantDetails = serializers.SerializerMethodField()
 
     orderItemTotal = serializers.SerializerMethodField()
@@ -65,6 +70,24 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = '__all__'
         depth = 1
 
+    # field -> (select_related, prefetch_related, prefetch when rendered as ids)
+    related_lookups = {
+        'product': (['product__seller'], ['product__images'], []),
+        'productVariant': ([], ['productVariant'], ['productVariant']),
+        'currentStatus': (['currentStatus'], [], []),
+        'allStatus': ([], ['statuses'], ['statuses']),
+        'paymentDetail': (['paymentDetail'], [], []),
+        'user': (['user'], [], []),
+        'shipping_address': (['shipping_address'], [], []),
+        'refund': (['refund'], [], []),
+        'variantDetails': ([], ['productVariant__variant'], []),
+        'orderItemTotal': (['product'], [], []),
+    }
+    expandable_fields = (
+        'product', 'productVariant', 'currentStatus', 'allStatus',
+        'paymentDetail', 'user', 'shipping_address', 'refund',
+    )
+
     def get_variantDetails(self, obj):
         variants = obj.productVariant.all()
         return [
@@ -80,6 +103,78 @@ class OrderItemSerializer(serializers.ModelSerializer):
     def get_orderItemTotal(self, obj):
         return obj.getOrderItemTotal()
 
+
+class OrderItemProductSummarySerializer(serializers.ModelSerializer):
+    # Only the cover image is prefetched for lists
+    images = ImagesSerializer(many=True, read_only=True, source='cover_images')
+
+    class Meta:
+        model = Product
+        fields = ['productId', 'name', 'base_price', 'discount_price', 'images']
+
+
+class OrderItemStatusSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderItemStatus
+        fields = ['status', 'created_at']
+
+
+class PaymentSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Payment
+        fields = ['paymentMethod', 'is_paid']
+
+
+class OrderItemListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Lean projection for the purchase history list, rendered from
+    optimize_queryset() in a fixed number of queries per page. The full
+    representation stays with OrderItemSerializer on the detail endpoint.
+    Supports the same fields=/expand= sparse fieldsets.
+    """
+    product = OrderItemProductSummarySerializer(read_only=True)
+    currentStatus = OrderItemStatusSummarySerializer(read_only=True)
+    paymentDetail = PaymentSummarySerializer(read_only=True)
+    variantDetails = serializers.SerializerMethodField()
+    orderItemTotal = serializers.SerializerMethodField()
+
+    class Meta:
+        model = OrderItem
+        fields = [
+            'id', 'orderItemId', 'qty', 'unit_price', 'orderItemTotal', 'status', 'currentStatus',
+            'paymentDetail', 'product', 'variantDetails', 'created_at', 'updated_at',
+        ]
+
+    # field -> (select_related, prefetch_related, prefetch when rendered as ids)
+    related_lookups = {
+        'product': (['product'], [], []),
+        'currentStatus': (['currentStatus'], [], []),
+        'paymentDetail': (['paymentDetail'], [], []),
+        'variantDetails': ([], ['productVariant__variant'], []),
+        'orderItemTotal': (['product'], [], []),
+    }
+    expandable_fields = ('product', 'currentStatus', 'paymentDetail')
+
+    @classmethod
+    def optimize_queryset(cls, queryset, fields=None, expand=None):
+        queryset = super().optimize_queryset(queryset, fields, expand)
+        if fields is None or ('product' in fields and 'product' in (expand or ())):
+            # Only the cover image of each product is rendered
+            queryset = queryset.prefetch_related(
+                Prefetch('product__images', queryset=Images.objects.order_by('id')[:1], to_attr='cover_images')
+            )
+        return queryset
+
+    def get_variantDetails(self, obj):
+        return [
+            {'id': variant.id, 'name': variant.variant.name, 'value': variant.value}
+            for variant in obj.productVariant.all()
+        ]
+
+    def get_orderItemTotal(self, obj):
+        return obj.getOrderItemTotal()
+
+
 class OrderSerializer(serializers.ModelSerializer):
     orderItems = OrderItemSerializer(many=True, read_only=True)
     orderTotal = serializers.SerializerMethodField()
@@ -89,6 +184,12 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = '__all__'
         depth = 1
 
+    @classmethod
+    def optimize_queryset(cls, queryset):
+        # Lines come with their live totals, so an open cart never fetches products one by one
+        lines = OrderItemSerializer.optimize_queryset(OrderItem.objects.with_totals())
+        return queryset.prefetch_related(Prefetch('orderItems', queryset=lines))
+
     def get_orderTotal(self, obj):
         if obj:
             return obj.getOrderTotal()
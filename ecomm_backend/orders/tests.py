@@ -1,3 +1,360 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import Address, CustomUser
+from core.models import MyPayout
+from core.outbox import run_pending
+from products.models import Category, Product, ProductVariant, Variant
+from sellers.models import Seller, SellerPayout
+from .checkout import OrderAlreadyPaid, ReservationExpired, add_cart_line, pay_order, place_order
+from .handlers import create_payouts
+from .models import Order, OrderItem, OrderItemStatus, Payment, StockReservation
+from .payments import PaymentDeclined, PaymentError
+from .reservations import InsufficientStock, commit_reservations, release_expired_reservations
+from .utils import variant_signature
+
+
+def make_product(productId, stock):
+    user, _ = CustomUser.objects.get_or_create(username='seller', defaults={'email': 'seller@example.com'})
+    seller, _ = Seller.objects.get_or_create(
+        user=user, defaults={'business_name': 'Shop', 'business_address': 'Street', 'phone_number': '1'}
+    )
+    return Product.objects.create(
+        seller=seller, productId=productId, name=productId, description='', base_price=10, stock=stock
+    )
+
+
+def make_cart(username, lines):
+    user = CustomUser.objects.create_user(username, f'{username}@example.com', 'password')
+    address = Address.objects.create(user=user, street_address='s', city='c', state='s', postal_code='1')
+    order = Order.objects.create(orderId=f'ORD-{username}', user=user)
+    for index, (product, qty) in enumerate(lines):
+        item = OrderItem.objects.create(orderItemId=f'ITM-{username}-{index}', user=user, product=product, qty=qty)
+        order.orderItems.add(item)
+    return user, address, order
+
+
+class CartLineTests(TestCase):
+
+    def setUp(self):
+        self.product = make_product('shirt', 10)
+        category = Category.objects.create(name='Shirts', slug='shirts')
+        color = Variant.objects.create(name='color', category=category)
+        size = Variant.objects.create(name='size', category=category)
+        self.red = ProductVariant.objects.create(product=self.product, variant=color, value='red')
+        self.large = ProductVariant.objects.create(product=self.product, variant=size, value='L')
+        self.user, _, self.order = make_cart('buyer', [])
+
+    def test_same_selection_shares_a_line(self):
+        self.assertTrue(add_cart_line(self.user, self.order, self.product, [self.red, self.large], 1))
+        self.assertFalse(add_cart_line(self.user, self.order, self.product, [self.large, self.red], 2))
+        self.assertTrue(add_cart_line(self.user, self.order, self.product, [self.red], 1))
+
+        lines = OrderItem.objects.order_by('id')
+        self.assertEqual([line.qty for line in lines], [3, 1])
+        self.assertEqual(lines[0].variantSignature, variant_signature([self.red.id, self.large.id]))
+        self.assertEqual(self.order.orderItems.count(), 2)
+
+    def test_duplicate_open_line_is_rejected(self):
+        add_cart_line(self.user, self.order, self.product, [self.red], 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            OrderItem.objects.create(
+                orderItemId='ITM-duplicate', user=self.user, product=self.product,
+                variantSignature=variant_signature([self.red.id]), qty=1
+            )
+
+
+class StockReservationTests(TestCase):
+
+    def test_short_line_rejects_whole_cart(self):
+        plenty, scarce = make_product('plenty', 10), make_product('scarce', 1)
+        user, address, order = make_cart('buyer', [(plenty, 2), (scarce, 2)])
+
+        with self.assertRaises(InsufficientStock) as raised:
+            place_order(user, order, address, 'cod')
+
+        self.assertEqual(raised.exception.short_items(), [{'productId': 'scarce', 'requested': 2, 'available': 1}])
+        plenty.refresh_from_db()
+        self.assertEqual((plenty.stock, plenty.sold), (10, 0))
+        self.assertFalse(OrderItem.objects.filter(is_ordered=True).exists())
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_card_hold_is_sold_on_commit(self):
+        product = make_product('held', 5)
+        user, address, order = make_cart('buyer', [(product, 2)])
+
+        place_order(user, order, address, 'card')
+        product.refresh_from_db()
+        self.assertEqual((product.stock, product.sold), (3, 0))
+
+        self.assertTrue(commit_reservations(order.orderItems.all()))
+        product.refresh_from_db()
+        self.assertEqual((product.stock, product.sold), (3, 2))
+        self.assertEqual(release_expired_reservations(now=timezone.now() + timedelta(days=1)), 0)
+
+    def test_expired_hold_returns_stock(self):
+        product = make_product('abandoned', 5)
+        user, address, order = make_cart('buyer', [(product, 2)])
+        place_order(user, order, address, 'card')
+
+        self.assertEqual(release_expired_reservations(now=timezone.now() + timedelta(days=1)), 1)
+        product.refresh_from_db()
+        self.assertEqual((product.stock, product.sold), (5, 0))
+        self.assertEqual(OrderItem.objects.get().currentStatus.status, 'Cancelled')
+        self.assertFalse(commit_reservations(order.orderItems.all()))
+
+
+class PayoutOutboxTests(TestCase):
+
+    def test_cod_payouts_are_created_by_the_worker(self):
+        product = make_product('payout', 5)
+        user, address, order = make_cart('buyer', [(product, 2)])
+
+        items = place_order(user, order, address, 'cod')
+        self.assertFalse(SellerPayout.objects.exists())
+
+        self.assertEqual(run_pending(), (1, 1))
+        self.assertEqual(SellerPayout.objects.get().amount, 18)
+        self.assertEqual(MyPayout.objects.get().amount, 2)
+
+        # Delivery is at-least-once: a repeated message creates nothing new
+        create_payouts({'orderItemIds': [item.id for item in items]})
+        self.assertEqual((SellerPayout.objects.count(), MyPayout.objects.count()), (1, 1))
+
+
+class CardPaymentTests(TestCase):
+    card = {'number': '4242424242424242', 'expiry': '12/30', 'cvv': '123'}
+
+    def test_one_capture_pays_every_line(self):
+        first, second = make_product('first', 5), make_product('second', 5)
+        user, address, order = make_cart('buyer', [(first, 1), (second, 2)])
+        place_order(user, order, address, 'card')
+
+        payments = pay_order(user, order, self.card)
+        self.assertEqual(sorted(payment.amount for payment in payments), [10, 20])
+        self.assertEqual(len({payment.transactionId for payment in payments}), 1)
+        self.assertFalse(order.orderItems.filter(paymentDetail__isnull=True).exists())
+        second.refresh_from_db()
+        self.assertEqual(second.sold, 2)
+
+        with self.assertRaises(OrderAlreadyPaid):
+            pay_order(user, order, self.card)
+
+    def test_declined_card_records_nothing(self):
+        product = make_product('declined', 5)
+        user, address, order = make_cart('buyer', [(product, 1)])
+        place_order(user, order, address, 'card')
+
+        with self.assertRaises(PaymentDeclined):
+            pay_order(user, order, {**self.card, 'number': '4000000000000002'})
+        self.assertFalse(Payment.objects.exists())
+        self.assertEqual(StockReservation.objects.get().status, 'held')
+
+    def test_failed_void_keeps_the_original_error(self):
+        product = make_product('unvoided', 5)
+        user, address, order = make_cart('buyer', [(product, 1)])
+        place_order(user, order, address, 'card')
+
+        with mock.patch('orders.checkout.commit_reservations', return_value=False), \
+                mock.patch('orders.checkout.void_payment', side_effect=PaymentError('gateway down')) as void, \
+                self.assertLogs('orders.checkout', 'ERROR') as logs, \
+                self.assertRaises(ReservationExpired):
+            pay_order(user, order, self.card)
+        void.assert_called_once()
+        self.assertIn(f'Could not void capture {void.call_args.args[0]}', logs.output[0])
+        self.assertFalse(Payment.objects.exists())
+
+
+class OrderHistoryTests(TestCase):
+
+    def test_pages_and_filters(self):
+        products = [make_product(f'history{index}', 5) for index in range(3)]
+        user, address, order = make_cart('buyer', [(product, 1) for product in products])
+        items = place_order(user, order, address, 'cod')
+        items[0].set_status('Delivered')
+
+        client = APIClient()
+        client.force_authenticate(user)
+        first = client.get('/api/orders/user-orders/', {'page_size': 2}).data
+        second = client.get('/api/orders/user-orders/', {'page_size': 2, 'cursor': first['next_cursor']}).data
+        self.assertEqual(len(first['data']), 2)
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(
+            {line['orderItemId'] for line in first['data'] + second['data']},
+            {item.orderItemId for item in items},
+        )
+
+        delivered = client.get('/api/orders/user-orders/', {'status': 'Delivered'}).data['data']
+        self.assertEqual([line['orderItemId'] for line in delivered], [items[0].orderItemId])
+        self.assertEqual(client.get('/api/orders/user-orders/', {'date_to': '2020-01-01'}).data['data'], [])
+
+    def test_filters_on_return_status_and_payment(self):
+        products = [make_product(f'returns{index}', 5) for index in range(2)]
+        user, address, order = make_cart('buyer', [(product, 1) for product in products])
+        items = place_order(user, order, address, 'cod')
+        # The status written by update_return_request_status
+        items[1].set_status('Return Approved')
+
+        client = APIClient()
+        client.force_authenticate(user)
+        approved = client.get('/api/orders/user-orders/', {'status': 'Return Approved,Return Rejected'}).data['data']
+        self.assertEqual([line['orderItemId'] for line in approved], [items[1].orderItemId])
+        self.assertEqual(client.get('/api/orders/user-orders/', {'status': 'Approved'}).status_code, 400)
+
+        self.assertEqual(len(client.get('/api/orders/user-orders/', {'paid': 'false'}).data['data']), 2)
+        self.assertEqual(client.get('/api/orders/user-orders/', {'paid': 'true'}).data['data'], [])
+
+    def test_sparse_fieldsets(self):
+        product = make_product('sparse', 5)
+        user, address, order = make_cart('buyer', [(product, 1)])
+        place_order(user, order, address, 'cod')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        [line] = client.get('/api/orders/user-orders/', {'fields': 'orderItemId,product'}).data['data']
+        self.assertEqual(set(line), {'orderItemId', 'product'})
+        self.assertEqual(line['product'], product.id)
+
+        # The page with its products joined in, then their cover images
+        with self.assertNumQueries(2):
+            [line] = client.get(
+                '/api/orders/user-orders/', {'fields': 'product', 'expand': 'product'}
+            ).data['data']
+        self.assertEqual(line['product']['productId'], product.productId)
+
+
+class StatusLogTests(TestCase):
+
+    def setUp(self):
+        user, address, order = make_cart('buyer', [(make_product('log', 5), 1)])
+        [self.item] = place_order(user, order, address, 'cod')
+
+    def test_transitions_append_events(self):
+        first = self.item.currentStatus
+        shipped = self.item.set_status('Shipped', shipped_from='Lahore', shipped_to='Karachi')
+        delivered = self.item.set_status('Delivered')
+
+        self.assertEqual(
+            [(event.pk, event.status) for event in self.item.statuses.all()],
+            [(first.pk, 'Pending'), (shipped.pk, 'Shipped'), (delivered.pk, 'Delivered')],
+        )
+        self.assertEqual(OrderItemStatus.objects.get(pk=shipped.pk).shipped_to, 'Karachi')
+        with self.assertRaises(ValueError):
+            shipped.save()
+
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.currentStatus_id, self.item.status), (delivered.pk, 'Delivered'))
+        self.assertEqual(OrderItem.objects.get(status='Delivered'), self.item)
+
+    def test_caller_saves_the_transition(self):
+        # The event is inserted, the item is left to the caller's one save
+        with self.assertNumQueries(1):
+            event = self.item.set_status('Cancelled', save=False)
+        self.assertEqual(OrderItem.objects.get(pk=self.item.pk).status, 'Pending')
+
+        self.item.qty = 2
+        with self.assertNumQueries(1):
+            self.item.save(update_fields=['qty', 'currentStatus', 'status'])
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.qty, self.item.currentStatus_id, self.item.status), (2, event.pk, 'Cancelled'))
+
+
+class StatusLogMigrationTests(TransactionTestCase):
+    """0020 replaces the allStatus many-to-many with the statuses log."""
+
+    before = [('orders', '0019_order_totals')]
+    after = [('orders', '0020_orderitem_status_log')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_backfill(self):
+        apps = self.migrate(self.before)
+        OrderItem = apps.get_model('orders', 'OrderItem')
+        OrderItemStatus = apps.get_model('orders', 'OrderItemStatus')
+        Seller = apps.get_model('sellers', 'Seller')
+        user = apps.get_model('accounts', 'CustomUser').objects.create(username='buyer')
+        seller = Seller.objects.create(user=user, business_name='Shop', business_address='Street', phone_number='1')
+        product = apps.get_model('products', 'Product').objects.create(
+            seller=seller, productId='legacy', name='legacy', description='', base_price=10, stock=5
+        )
+        shipped, returned = (
+            OrderItem.objects.create(orderItemId=f'ITM-{index}', user=user, product=product, is_ordered=True)
+            for index in range(2)
+        )
+        pending = OrderItemStatus.objects.create(orderItem=shipped, status='Pending')
+        in_transit = OrderItemStatus.objects.create(orderItem=shipped, status='Shipped', shipped_to='Karachi')
+        shipped.allStatus.add(pending, in_transit)
+        # An entry of another item: its history must survive the move
+        returned.allStatus.add(in_transit)
+
+        apps = self.migrate(self.after)
+        OrderItem = apps.get_model('orders', 'OrderItem')
+        shipped, returned = OrderItem.objects.get(pk=shipped.pk), OrderItem.objects.get(pk=returned.pk)
+        self.assertEqual((shipped.currentStatus_id, shipped.status), (in_transit.pk, 'Shipped'))
+        self.assertEqual(list(shipped.statuses.values_list('status', flat=True)), ['Pending', 'Shipped'])
+
+        [copy] = returned.statuses.all()
+        self.assertNotEqual(copy.pk, in_transit.pk)
+        self.assertEqual((copy.status, copy.shipped_to, copy.created_at), ('Shipped', 'Karachi', in_transit.created_at))
+        self.assertEqual((returned.currentStatus_id, returned.status), (copy.pk, 'Shipped'))
+        self.assertFalse(any(field.name == 'allStatus' for field in OrderItem._meta.get_fields()))
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Many buyers racing for the last units of a product on SQLite in WAL mode."""
+
+    buyers = 24
+    stock = 10
+
+    def test_no_oversell(self):
+        self.assertEqual(connection.cursor().execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+
+        product = make_product('last-units', self.stock)
+        other = make_product('other', self.buyers)
+        carts = [make_cart(f'buyer{index}', [(other, 1), (product, 1)]) for index in range(self.buyers)]
+
+        barrier = threading.Barrier(self.buyers)
+        outcomes, errors = [], []
+
+        def checkout(user, address, order):
+            try:
+                barrier.wait()
+                place_order(user, order, address, 'card')
+                outcomes.append('placed')
+            except InsufficientStock:
+                outcomes.append('rejected')
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=checkout, args=cart) for cart in carts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(outcomes.count('placed'), self.stock)
+        self.assertEqual(outcomes.count('rejected'), self.buyers - self.stock)
+
+        product.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+        # Rejected carts kept the line that was in stock untouched as well
+        self.assertEqual(other.stock, self.buyers - self.stock)
+        self.assertEqual(StockReservation.objects.filter(product=product, status='held').count(), self.stock)
@@ -1,21 +1,22 @@
-import random
-import string
-import time
+import hashlib
 
+from core.ids import generate_id
 from core.models import MyPayout
 from sellers.models import SellerPayout
 
-def generate_unique_id(prefix='', length=11):
-    """Generate a unique ID with the given prefix and length.
-    Format: PREFIX-TIMESTAMP-RANDOM
-    Example: ORD-12345-ABCD
+def generate_unique_id(prefix=''):
+    """Generate a unique, time-ordered ID with the given prefix.
+    Format: PREFIX-<13 character id from core.ids>
+    Example: ORD-0C8ZQ6W1R2004
     """
-    timestamp = str(int(time.time()))[-5:]  # Last 5 digits of timestamp
-    # Generate random string of remaining length (minus prefix, timestamp, and separators)
-    remaining_length = length - len(prefix) - len(timestamp) - 2  # -2 for separators
-    random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=remaining_length))
-    
-    return f"{prefix}-{timestamp}-{random_str}"
+    return generate_id(f"{prefix}-")
+
+def variant_signature(variant_ids):
+    """Order-independent key of a variant selection; '' when there is none."""
+    if not variant_ids:
+        return ''
+    canonical = ','.join(str(variant_id) for variant_id in sorted(set(variant_ids)))
+    return hashlib.sha1(canonical.encode()).hexdigest()
 
 def generate_order_id():
     """Generate a unique order ID"""
@@ -43,24 +44,21 @@ def calculate_payouts(amount, platform_fee_percentage):
     
     return seller_payout, platform_payout
 
-def createSellerPayout(orderItem, amount, seller):
-    payoutId = generate_seller_payout_id()
-    
+def buildSellerPayout(orderItem, amount, seller):
+    """Unsaved SellerPayout, for callers that bulk_create."""
     seller_payout, platform_payout = calculate_payouts(amount, PLATFORM_FEE)
-    sellerPayout = SellerPayout.objects.create(
-        payoutId=payoutId, 
-        orderItem=orderItem, 
+    return SellerPayout(
+        payoutId=generate_seller_payout_id(),
+        orderItem=orderItem,
         amount=seller_payout,
         seller=seller,
         )
-    return sellerPayout
-    
-def createMyPayout(orderItem, amount):
-    payoutId = generate_seller_payout_id()
+
+def buildMyPayout(orderItem, amount):
+    """Unsaved MyPayout, for callers that bulk_create."""
     seller_payout, platform_payout = calculate_payouts(amount, PLATFORM_FEE)
-    myPayout = MyPayout.objects.create(
-        payoutId=payoutId, 
-        orderItem=orderItem, 
+    return MyPayout(
+        payoutId=generate_seller_payout_id(),
+        orderItem=orderItem,
         amount=platform_payout,
         )
-    return myPayout
\ No newline at end of file
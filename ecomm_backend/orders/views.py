@@ -2,15 +2,23 @@ from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 import json
+from datetime import datetime, time, timedelta
 from products.models import Product, ProductVariant
-from .models import Order, OrderItem, Payment, OrderItemStatus, ReturnRequest, ReturnRequestStatus
-from .serializer import OrderSerializer, OrderItemSerializer, PaymentSerializer, ReturnRequestSerializer
+from .models import STATUS_CHOICES, Order, OrderItem, Payment, ReturnRequest, ReturnRequestStatus
+from .serializer import OrderSerializer, OrderItemListSerializer, OrderItemSerializer, PaymentSerializer, ReturnRequestSerializer
 from django.db.models import F, Sum
-from .utils import generate_order_id, generate_order_item_id, generate_seller_payout_id, createSellerPayout, createMyPayout
+from .utils import generate_order_id, generate_unique_id
+from .checkout import OrderAlreadyPaid, ReservationExpired, add_cart_line, pay_order, place_order
+from .payments import PaymentDeclined, PaymentError
+from .reservations import InsufficientStock
 from accounts.models import Address
 from django.shortcuts import get_object_or_404
 from django.conf import settings
-import uuid
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from core.pagination import InvalidCursor, paginate_keyset, parse_page_size
+from core.serializers import parse_fieldset
+from core.idempotency import idempotent
 
 
 from sellers.models import Seller, SellerPayout
@@ -43,6 +51,14 @@ def addToCart(request, productId):
                 'message': 'Invalid format for variants'
             }, status=400)
         
+        # Only variants of this product can be chosen
+        variants = list(ProductVariant.objects.filter(id__in=variant_ids, product=product)) if variant_ids else []
+        if len(variants) != len(set(variant_ids)):
+            return Response({
+                'status': 'error',
+                'message': 'Invalid variants for this product'
+            }, status=400)
+
         # Get or create an active order for the user
         order, created = Order.objects.get_or_create(
             user=request.user,
@@ -51,47 +67,11 @@ def addToCart(request, productId):
         )
         print(f"Order {'created' if created else 'found'}: {order.orderId}")  # Debug log
 
-        # Check for existing order items
-        existing_items = OrderItem.objects.filter(
-            user=request.user,
-            product=product,
-            is_ordered=False
-        )
-        print(f"Found {existing_items.count()} existing items")  # Debug log
-
-        # Compare variants to find a matching item
-        matching_item = None
-        for item in existing_items:
-            existing_variant_ids = set(item.productVariant.values_list('id', flat=True))
-            if existing_variant_ids == set(variant_ids):  
-                matching_item = item
-                break
-
-        if matching_item:
-            print(f"Updating existing item: {matching_item.orderItemId}")  # Debug log
-            # Update quantity of the existing item
-            matching_item.qty += qty
-            matching_item.save()
-        else:
-            print("Creating new order item")  # Debug log
-            # Create a new order item
-            new_item = OrderItem.objects.create(
-                orderItemId=generate_order_item_id(),
-                user=request.user,
-                product=product,
-                qty=qty
-            )
-            
-            # Add selected variants
-            if variant_ids:
-                variants = ProductVariant.objects.filter(id__in=variant_ids)
-                print(f"Adding variants: {list(variants.values_list('id', flat=True))}")  # Debug log
-                new_item.productVariant.set(variants)
-            
-            # Add the new item to the order
-            order.orderItems.add(new_item)
+        created = add_cart_line(request.user, order, product, variants, qty)
+        print(f"{'Created' if created else 'Updated'} cart line for {product.productId}")  # Debug log
 
         # Serialize the updated order
+        order = OrderSerializer.optimize_queryset(Order.objects.filter(pk=order.pk)).get()
         serialized_order = OrderSerializer(order)
         return Response({
             'status': 'success',
@@ -116,7 +96,9 @@ def addToCart(request, productId):
 def cartView(request):
     try:
         print(f"Fetching cart for user: {request.user.username}")  # Debug log
-        order = Order.objects.filter(user=request.user, is_ordered=False).first()
+        order = OrderSerializer.optimize_queryset(
+            Order.objects.filter(user=request.user, is_ordered=False)
+        ).first()
         
         if not order:
             print("No active order found")  # Debug log
@@ -129,7 +111,7 @@ def cartView(request):
                 }
             })
         
-        print(f"Found order with {order.orderItems.count()} items")  # Debug log
+        print(f"Found order with {len(order.orderItems.all())} items")  # Debug log
         serialized_order = OrderSerializer(order)
         return Response({
             'status': 'success',
@@ -206,6 +188,7 @@ def removeFromCart(request, orderItemId):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def checkout(request):
     try:
         shipping_address_id = request.data.get('shipping_address_id')
@@ -240,50 +223,14 @@ def checkout(request):
             }, status=400)
 
         order = Order.objects.get(user=request.user, is_ordered=False)
-        # Add items to order
-        for item in cart_items:
-            # Create initial status for each item
-            status = OrderItemStatus.objects.create(
-                status='Pending',
-                orderItem=item
-            )
-
-            item.shipping_address = shipping_address
-            item.order = order
-            item.is_ordered = True
-            item.currentStatus = status
-            item.allStatus.add(status)
-            item.save()
-
-            # Update product stock and sold count
-            product = item.product
-            product.stock -= item.qty
-            product.sold += item.qty
-            product.save()
-
-            if payment_method == 'cod':
-                payment = Payment.objects.create(
-                    paymentId=f"PAY_{item.orderItemId}",
-                    user=request.user,
-                    orderItem=item, 
-                    amount=item.getOrderItemTotal(),
-                    paymentMethod='cod',
-                  
-                )
-
-                # Creating Seller Payout
-                seller = item.product.seller
-                createSellerPayout(item, item.getOrderItemTotal(), seller)
-
-                # Creating My Payout
-                createMyPayout(item, item.getOrderItemTotal())
-
-                item.paymentDetail = payment
-                item.save()
-
-        order.is_ordered = True
-        order.save()
-
+        try:
+            place_order(request.user, order, shipping_address, payment_method)
+        except InsufficientStock as e:
+            return Response({
+                'status': 'error',
+                'message': str(e),
+                'data': e.short_items()
+            }, status=409)
 
         return Response({
             'status': 'success',
@@ -303,18 +250,19 @@ def checkout(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def process_payment(request):
     try:
         order_id = request.data.get('order_id')
         card_number = request.data.get('card_number')
         expiry_date = request.data.get('expiry_date')
         cvv = request.data.get('cvv')
-        amount = request.data.get('amount')
 
-        print(f"Received payment details: order_id={order_id}, card_number={card_number}, expiry_date={expiry_date}, cvv={cvv}, amount={amount}")
+        # Never log card details
+        print(f"Received payment for order_id={order_id}")
 
-        # Validate input
-        if not all([order_id, card_number, expiry_date, cvv, amount]):
+        # Validate input. The client's `amount` is not trusted: the stored order total is charged
+        if not all([order_id, card_number, expiry_date, cvv]):
             return Response({
                 'status': 'error',
                 'message': 'All payment details are required - Backend' 
@@ -329,31 +277,8 @@ def process_payment(request):
 
       
         try:
-            order = Order.objects.get(orderId=order_id, user=request.user)
-           
-           
-            for orderItem in order.orderItems.all():
-                
-
-                # Create payment record
-                newPayment =Payment.objects.create(
-                    user=request.user,
-                    orderItem=orderItem,
-                    paymentMethod='Credit/Debit Card',
-                    paymentId=f'PAY_{orderItem.orderItemId}',
-                    amount=amount,
-                    is_paid=True
-                )
-
-                # Creating Seller Payout
-                seller = orderItem.product.seller
-                createSellerPayout(orderItem, amount, seller)
-
-                # Creating My Payout
-                createMyPayout(orderItem, amount)
-
-                orderItem.paymentDetail = newPayment
-                orderItem.save()
+            order = Order.objects.get(orderId=order_id, user=request.user, is_ordered=True)
+            pay_order(request.user, order, {'number': card_number, 'expiry': expiry_date, 'cvv': cvv})
 
             return Response({
                 'status': 'success',
@@ -361,6 +286,28 @@ def process_payment(request):
                
             })
 
+        except OrderAlreadyPaid:
+            return Response({
+                'status': 'error',
+                'message': 'Order is already paid'
+            }, status=409)
+        except ReservationExpired:
+            # The stock held at checkout was released while the buyer was away
+            return Response({
+                'status': 'error',
+                'message': 'Your reservation has expired, please place the order again'
+            }, status=409)
+        except PaymentDeclined as e:
+            return Response({
+                'status': 'error',
+                'message': str(e)
+            }, status=402)
+        except PaymentError as e:
+            print(f"Payment gateway error: {str(e)}")
+            return Response({
+                'status': 'error',
+                'message': 'Payment could not be processed, please try again'
+            }, status=502)
         except Order.DoesNotExist:
             return Response({
                 'status': 'error',
@@ -381,14 +328,67 @@ def process_payment(request):
 @permission_classes([IsAuthenticated])
 def get_user_orders(request):
     try:
-        orderItems = OrderItem.objects.filter(user=request.user, is_ordered=True).order_by('-created_at')
-        orderItemSerializer = OrderItemSerializer(orderItems, many=True)
+        statuses = [value for value in request.GET.get('status', '').split(',') if value]
+        date_from = request.GET.get('date_from')
+        date_to = request.GET.get('date_to')
+        paid = request.GET.get('paid', '').lower()
+        cursor = request.GET.get('cursor')
+        fields, expand = parse_fieldset(request)
 
+        try:
+            page_size = parse_page_size(request.GET.get('page_size'))
+        except ValueError:
+            return Response({
+                'status': 'error',
+                'message': 'Invalid page size'
+            }, status=400)
+
+        orderItems = OrderItem.objects.filter(user=request.user, is_ordered=True)
+
+        if statuses:
+            valid = {choice for choice, _ in STATUS_CHOICES}
+            if not valid.issuperset(statuses):
+                return Response({
+                    'status': 'error',
+                    'message': 'Invalid status filter'
+                }, status=400)
+            orderItems = orderItems.filter(status__in=statuses)
+
+        if paid:
+            if paid not in ('true', 'false'):
+                return Response({
+                    'status': 'error',
+                    'message': 'Invalid paid filter, use true or false'
+                }, status=400)
+            orderItems = orderItems.filter(paymentDetail__is_paid=paid == 'true')
+
+        # Dates are whole days in the active timezone, both ends inclusive
+        try:
+            if date_from:
+                orderItems = orderItems.filter(created_at__gte=_start_of_day(date_from))
+            if date_to:
+                orderItems = orderItems.filter(created_at__lt=_start_of_day(date_to) + timedelta(days=1))
+        except ValueError:
+            return Response({
+                'status': 'error',
+                'message': 'Invalid date format, use YYYY-MM-DD'
+            }, status=400)
+
+        try:
+            page, next_cursor = paginate_keyset(
+                OrderItemListSerializer.optimize_queryset(orderItems, fields, expand),
+                ('-created_at', '-id'), cursor, page_size,
+            )
+        except InvalidCursor:
+            return Response({
+                'status': 'error',
+                'message': 'Invalid cursor'
+            }, status=400)
 
-      
         return Response({
             'status': 'success',
-            'data': orderItemSerializer.data
+            'next_cursor': next_cursor,
+            'data': OrderItemListSerializer(page, many=True, fields=fields, expand=expand).data
         })
     except Exception as e:
         return Response({
@@ -396,15 +396,26 @@ def get_user_orders(request):
             'message': str(e)
         }, status=500)
 
+
+def _start_of_day(value):
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(value)
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_order_detail(request, orderItem_id):
     try:
         print(f"Fetching order item: {orderItem_id}")
-        order_item = OrderItem.objects.get(orderItemId=orderItem_id)
+        fields, expand = parse_fieldset(request)
+        order_item = OrderItemSerializer.optimize_queryset(
+            OrderItem.objects.all(), fields, expand
+        ).get(orderItemId=orderItem_id)
         paymentObj = Payment.objects.get(orderItem=order_item)
         paymentObjSerializer = PaymentSerializer(paymentObj)
-        serializer = OrderItemSerializer(order_item)
+        serializer = OrderItemSerializer(order_item, fields=fields, expand=expand)
 
         returnRequest = ReturnRequest.objects.filter(orderItem=order_item)
         if returnRequest.exists():
@@ -441,7 +452,7 @@ def request_return(request, orderitem_id):
         order_item = OrderItem.objects.get(orderItemId=orderitem_id, user=request.user)
         
         # Check if the order item is delivered
-        if not order_item.currentStatus or order_item.currentStatus.status != 'Delivered':
+        if order_item.status != 'Delivered':
             return Response({
                 'status': 'error',
                 'message': 'Return can only be requested for delivered items'
@@ -455,7 +466,7 @@ def request_return(request, orderitem_id):
             }, status=400)
             
         # Generate unique return request ID
-        return_request_id = f"RET-{uuid.uuid4().hex[:8].upper()}"
+        return_request_id = generate_unique_id(prefix="RET")
         
         # Create return request
         return_request = ReturnRequest.objects.create(
@@ -473,14 +484,7 @@ def request_return(request, orderitem_id):
         )
 
         # Update order item status to Return Requested
-        orderItemStatus = OrderItemStatus.objects.create(
-            orderItem=order_item,
-            status='Return Requested',
-        )
-
-        order_item.currentStatus = orderItemStatus
-        order_item.allStatus.add(orderItemStatus)
-        order_item.save()
+        order_item.set_status('Return Requested')
 
         return_request.currentStatus = return_request_status
         return_request.allStatus.add(return_request_status)
@@ -0,0 +1,128 @@
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db.models import Count, Max, Min, Q
+
+from .models import ProductVariant
+
+
+# Price facet: at most this many [min, max) buckets on base_price, with round
+# bounds derived from the prices in the result; the last is unbounded
+PRICE_BUCKET_COUNT = 5
+NICE_STEPS = (1, 2, Decimal('2.5'), 5, 10)
+
+# Filter dimension of one variant name, e.g. 'variant:color'
+VARIANT_PREFIX = 'variant:'
+
+
+def variant_dimension(name):
+    return f'{VARIANT_PREFIX}{name.lower()}'
+
+
+def combine_filters(filters, exclude=None):
+    condition = Q()
+    for dimension, q in filters.items():
+        if dimension != exclude:
+            condition &= q
+    return condition
+
+
+def _number(value):
+    return int(value) if value == value.to_integral_value() else float(value)
+
+
+def price_buckets(lowest, highest, count=PRICE_BUCKET_COUNT):
+    """
+    [min, max) bounds of at most `count` equal buckets with round bounds
+    (multiples of 1, 2, 2.5 or 5 times a power of ten) covering
+    `lowest`..`highest`. The last bucket is unbounded (max None).
+    """
+    if lowest is None:
+        return []
+    lowest, highest = Decimal(str(lowest)), Decimal(str(highest))
+    span = (highest - lowest) / count
+    if span <= 0:
+        return [(_number(lowest), None)]
+
+    magnitude = Decimal(10) ** span.adjusted()
+    step = next(magnitude * nice for nice in NICE_STEPS if magnitude * nice >= span)
+    low = (lowest / step).to_integral_value(rounding='ROUND_FLOOR') * step
+
+    buckets = []
+    while len(buckets) < count - 1 and low + step < highest:
+        buckets.append((_number(low), _number(low + step)))
+        low += step
+    buckets.append((_number(low), None))
+    return buckets
+
+
+def _price_bucket_q(low, high):
+    condition = Q(base_price__gte=low)
+    if high is not None:
+        condition &= Q(base_price__lt=high)
+    return condition
+
+
+def _variant_counts(products, names):
+    return ProductVariant.objects.filter(product_id__in=products.values('id')).filter(names).values(
+        'variant__name', 'value'
+    ).annotate(count=Count('product_id', distinct=True))
+
+
+def _name_q(names):
+    return reduce(or_, (Q(variant__name__iexact=name) for name in names))
+
+
+def compute_facets(products, filters):
+    """
+    Facet counts for the listing: one grouped query per facet. Each facet is
+    counted against every active filter except its own, so selecting a
+    category still shows the counts of its sibling categories, and selecting
+    a color narrows the size counts but not the other colors.
+    `products` is the (search-filtered) base queryset, `filters` maps a
+    dimension ('category', 'price' or variant_dimension(name)) to its Q.
+    """
+    base = products.order_by()
+
+    categories = base.filter(combine_filters(filters, 'category')).values(
+        'category_id', 'category__name'
+    ).annotate(count=Count('id')).order_by('category__name')
+
+    # Variant names without a selection share one query under all filters;
+    # each selected name gets its own, leaving out only its own filter
+    selected = [dimension[len(VARIANT_PREFIX):] for dimension in filters if dimension.startswith(VARIANT_PREFIX)]
+    unselected = ~_name_q(selected) if selected else Q()
+    variant_rows = list(_variant_counts(base.filter(combine_filters(filters)), unselected))
+    for name in selected:
+        variant_rows += _variant_counts(
+            base.filter(combine_filters(filters, variant_dimension(name))), _name_q([name])
+        )
+    variant_rows.sort(key=lambda row: (row['variant__name'], row['value']))
+
+    priced = base.filter(combine_filters(filters, 'price'))
+    bounds = priced.aggregate(lowest=Min('base_price'), highest=Max('base_price'))
+    buckets = price_buckets(bounds['lowest'], bounds['highest'])
+    price_counts = priced.aggregate(**{
+        f'bucket_{i}': Count('id', filter=_price_bucket_q(low, high))
+        for i, (low, high) in enumerate(buckets)
+    }) if buckets else {}
+
+    variants = {}
+    for row in variant_rows:
+        variants.setdefault(row['variant__name'], []).append({
+            'value': row['value'],
+            'count': row['count'],
+        })
+
+    return {
+        'categories': [
+            {'id': row['category_id'], 'name': row['category__name'], 'count': row['count']}
+            for row in categories
+        ],
+        'variants': variants,
+        'price': [
+            {'min': low, 'max': high, 'count': price_counts[f'bucket_{i}']}
+            for i, (low, high) in enumerate(buckets)
+        ],
+    }
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from products.search import fts_enabled, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the SQLite FTS5 product search index in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if not fts_enabled(using):
+            raise CommandError('The product search index is only available on SQLite with the products migrations applied')
+
+        with transaction.atomic(using=using):
+            count = rebuild_search_index(using)
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} products'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.ratings import recompute_product_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored rating aggregates of every product from its reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        updated = recompute_product_ratings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Recomputed ratings for {updated} reviewed products'))
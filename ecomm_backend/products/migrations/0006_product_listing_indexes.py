@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_variant_category'),
+        ('sellers', '0007_sellerpayout_isrefunded'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-created_at', '-id'], name='product_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['base_price', 'id'], name='product_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-sold', '-id'], name='product_popular_idx'),
+        ),
+    ]
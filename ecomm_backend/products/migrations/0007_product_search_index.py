@@ -0,0 +1,49 @@
+from django.db import migrations
+
+
+# Full-text index over Product. It is kept in sync by products.signals rather
+# than triggers: SQLite drops a table's triggers whenever a migration rebuilds it.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_product_fts USING fts5(
+        name, description, category_name,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    INSERT INTO products_product_fts(rowid, name, description, category_name)
+    SELECT p.id, p.name, p.description, c.name
+    FROM products_product p LEFT JOIN products_category c ON c.id = p.category_id
+    """,
+]
+
+DROP_SQL = [
+    'DROP TABLE IF EXISTS products_product_fts',
+]
+
+
+def create_search_index(apps, schema_editor):
+    # Other backends keep using the icontains fallback in products.search
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
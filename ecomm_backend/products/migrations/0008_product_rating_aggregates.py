@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:02
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_ratings(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductReview = apps.get_model('products', 'ProductReview')
+
+    stats = ProductReview.objects.order_by().values('product').annotate(
+        count=Count('id'),
+        total=Sum('rating'),
+        **{f'rating_{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)},
+    )
+    for row in stats:
+        Product.objects.filter(pk=row['product']).update(
+            rating_avg=row['total'] / row['count'],
+            rating_count=row['count'],
+            rating_sum=row['total'],
+            **{f'rating_{star}': row[f'rating_{star}'] for star in range(1, 6)},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
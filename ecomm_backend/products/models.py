@@ -35,12 +35,34 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
     subcategory = models.ForeignKey(SubCategory, on_delete=models.SET_NULL, null=True, blank=True)
+
+    # Review aggregates, maintained by products.ratings on every ProductReview write
+    rating_avg = models.FloatField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Composite indexes backing the keyset pagination of each listing sort
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='product_newest_idx'),
+            models.Index(fields=['base_price', 'id'], name='product_price_idx'),
+            models.Index(fields=['-sold', '-id'], name='product_popular_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    def get_rating_histogram(self):
+        return {str(star): getattr(self, f'rating_{star}') for star in range(1, 6)}
+
 class Images(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='products/')
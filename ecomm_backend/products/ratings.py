@@ -0,0 +1,79 @@
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from .models import Product, ProductReview
+
+
+STARS = range(1, 6)
+
+
+def _star_field(rating):
+    # Ratings are not validated on input, so only 1-5 land in the histogram
+    if rating is not None and int(rating) in STARS:
+        return f'rating_{int(rating)}'
+    return None
+
+
+def apply_rating_change(product_id, old_rating=None, new_rating=None):
+    """
+    Atomically move one review's contribution on `product_id` from
+    `old_rating` to `new_rating` (None for a created/deleted review).
+    """
+    count_delta = (new_rating is not None) - (old_rating is not None)
+    sum_delta = int(new_rating or 0) - int(old_rating or 0)
+    if not count_delta and not sum_delta:
+        return
+
+    new_count = F('rating_count') + count_delta
+    new_sum = F('rating_sum') + sum_delta
+    updates = {
+        'rating_count': new_count,
+        'rating_sum': new_sum,
+        'rating_avg': Coalesce(
+            Cast(new_sum, FloatField()) / NullIf(new_count, 0),
+            Value(0.0),
+            output_field=FloatField(),
+        ),
+    }
+
+    old_field, new_field = _star_field(old_rating), _star_field(new_rating)
+    if old_field != new_field:
+        if old_field:
+            updates[old_field] = F(old_field) - 1
+        if new_field:
+            updates[new_field] = F(new_field) + 1
+
+    Product.objects.filter(pk=product_id).update(**updates)
+
+
+def recompute_product_ratings(batch_size=500):
+    """Rebuild every product's rating aggregates from ProductReview in bulk."""
+    fields = ['rating_avg', 'rating_count', 'rating_sum'] + [f'rating_{star}' for star in STARS]
+    stats = ProductReview.objects.order_by().values('product').annotate(
+        count=Count('id'),
+        total=Sum('rating'),
+        **{f'rating_{star}': Count('id', filter=Q(rating=star)) for star in STARS},
+    )
+
+    updated = 0
+    with transaction.atomic():
+        Product.objects.update(**{field: 0 for field in fields})
+
+        batch = []
+        for row in stats.iterator(chunk_size=batch_size):
+            batch.append(Product(
+                pk=row['product'],
+                rating_avg=row['total'] / row['count'],
+                rating_count=row['count'],
+                rating_sum=row['total'],
+                **{f'rating_{star}': row[f'rating_{star}'] for star in STARS},
+            ))
+            if len(batch) >= batch_size:
+                Product.objects.bulk_update(batch, fields)
+                updated += len(batch)
+                batch = []
+        if batch:
+            Product.objects.bulk_update(batch, fields)
+            updated += len(batch)
+    return updated
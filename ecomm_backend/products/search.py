@@ -0,0 +1,106 @@
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+
+FTS_TABLE = 'products_product_fts'
+
+# bm25 column weights for (name, description, category_name)
+BM25_WEIGHTS = (10.0, 1.0, 4.0)
+
+_fts_tables = {}
+
+
+def fts_enabled(using='default'):
+    """True when the SQLite FTS5 index created by the products migrations exists."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    if using not in _fts_tables:
+        _fts_tables[using] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_tables[using]
+
+
+def build_match_query(query):
+    # Quote every term so user input can never be parsed as FTS5 syntax,
+    # and prefix-match each one to keep the "as you type" feel of icontains
+    terms = re.findall(r'\w+', query)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_products(queryset, query):
+    """
+    Filter `queryset` to products matching `query` and annotate `search_rank`
+    (BM25, lower is more relevant).
+    """
+    match = build_match_query(query)
+    if not match or not fts_enabled(queryset.db):
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(description__icontains=query) |
+            Q(category__name__icontains=query)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+    return queryset.filter(
+        id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+    ).annotate(
+        search_rank=RawSQL(
+            f'SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = "products_product"."id"',
+            [match],
+            output_field=FloatField(),
+        )
+    )
+
+
+def index_product(product, using='default'):
+    """Insert or refresh one product's row in the FTS5 index."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE}(rowid, name, description, category_name) '
+            'SELECT %s, %s, %s, (SELECT name FROM products_category WHERE id = %s)',
+            [product.pk, product.name, product.description, product.category_id]
+        )
+
+
+def unindex_product(product_id, using='default'):
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product_id])
+
+
+def reindex_category(category_id, using='default'):
+    """Refresh the category name of every indexed product in `category_id`."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {FTS_TABLE} SET category_name = (SELECT name FROM products_category WHERE id = %s) '
+            'WHERE rowid IN (SELECT id FROM products_product WHERE category_id = %s)',
+            [category_id, category_id]
+        )
+
+
+def clear_category(category_name, using='default'):
+    # Deleting a category nulls Product.category_id with a bulk UPDATE that sends no signals
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {FTS_TABLE} SET category_name = NULL WHERE category_name = %s '
+            'AND rowid IN (SELECT id FROM products_product WHERE category_id IS NULL)',
+            [category_name]
+        )
+
+
+def rebuild_search_index(using='default'):
+    """Repopulate the FTS5 index from products_product in a single pass."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE}(rowid, name, description, category_name) '
+            'SELECT p.id, p.name, p.description, c.name '
+            'FROM products_product p LEFT JOIN products_category c ON c.id = p.category_id'
+        )
+        count = cursor.rowcount
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return count
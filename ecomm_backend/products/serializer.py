@@ -1,8 +1,8 @@
 from rest_framework import serializers
 from .models import Product, ProductAttributes, Category, SubCategory, Images, Variant, ProductVariant, ProductReview
 
-from sellers.serializer import SellerSerializer
-from django.db import models
+from sellers.serializer import SellerSummarySerializer
+from core.serializers import SparseFieldsetMixin
 
 
 # Serializer for ProductAttributes
@@ -56,15 +56,16 @@ class CategorySerializer(serializers.ModelSerializer):
 
 
 # Serializer for Product
-class ProductSerializer(serializers.ModelSerializer):
-    seller = SellerSerializer(read_only=True)
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    seller = SellerSummarySerializer(read_only=True)
     images = ImagesSerializer(many=True, read_only=True)  # Nested Images
     attributes = ProductAttributesSerializer(many=True, read_only=True)  # Nested ProductAttributes
     variants = ProductVariantSerializer(many=True, read_only=True)  # Nested ProductVariants
     category = CategorySerializer(read_only=True)  # Nested Category
     subcategory = SubCategorySerializer(read_only=True)  # Nested SubCategory
-    rating = serializers.FloatField(source='reviews.rating', read_only=True)
-    review_count = serializers.IntegerField(source='reviews.count', read_only=True)
+    rating = serializers.FloatField(source='rating_avg', read_only=True)
+    review_count = serializers.IntegerField(source='rating_count', read_only=True)
+    rating_histogram = serializers.DictField(source='get_rating_histogram', read_only=True)
 
     class Meta:
         model = Product
@@ -74,15 +75,20 @@ class ProductSerializer(serializers.ModelSerializer):
             'id', 'name','seller','productId', 'description', 'base_price', 'discount_price', 
             'stock', 'sold', 'is_active', 'created_at', 'updated_at', 
             'images', 'attributes', 'variants', 'category', 'subcategory',
-            'rating', 'review_count'
+            'rating', 'review_count', 'rating_histogram'
         ]
 
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        reviews = instance.reviews.all()
-        representation['review_count'] = reviews.count()
-        representation['rating'] = reviews.aggregate(avg_rating=models.Avg('rating'))['avg_rating'] or 0
-        return representation
+    # field -> (select_related, prefetch_related, prefetch when rendered as ids)
+    related_lookups = {
+        'seller': (['seller'], [], []),
+        'category': (['category'], ['category__subcategories'], []),
+        'subcategory': (['subcategory'], [], []),
+        'images': ([], ['images'], ['images']),
+        'attributes': ([], ['attributes'], ['attributes']),
+        'variants': ([], ['variants__variant'], ['variants']),
+    }
+    expandable_fields = ('seller', 'category', 'subcategory', 'images', 'attributes', 'variants')
+    deferrable_fields = ('description',)
 
 
 class ProductReviewSerializer(serializers.ModelSerializer):
@@ -0,0 +1,146 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core.cache import invalidate_tags_on_commit
+from sellers.models import Seller
+from .models import (
+    Category, Images, Product, ProductAttributes, ProductReview, ProductVariant, SubCategory, Variant,
+)
+from .ratings import apply_rating_change
+from .utils import invalidate_variant_options
+from .variant_index import variant_index
+from . import search
+
+
+SEARCH_FIELDS = {'name', 'description', 'category', 'category_id'}
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, created, update_fields=None, using='default', **kwargs):
+    if not search.fts_enabled(using):
+        return
+    if update_fields and not SEARCH_FIELDS.intersection(update_fields):
+        return
+    search.index_product(instance, using)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_on_delete(sender, instance, using='default', **kwargs):
+    if search.fts_enabled(using):
+        search.unindex_product(instance.pk, using)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_on_save(sender, instance, created, using='default', **kwargs):
+    if not created and search.fts_enabled(using):
+        search.reindex_category(instance.pk, using)
+
+
+@receiver(post_delete, sender=Category)
+def clear_category_on_delete(sender, instance, using='default', **kwargs):
+    if search.fts_enabled(using):
+        search.clear_category(instance.name, using)
+
+
+@receiver(pre_save, sender=ProductReview)
+def remember_review_rating(sender, instance, **kwargs):
+    # Keep the stored rating around so an edit can move its contribution
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = (
+            ProductReview.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=ProductReview)
+def update_rating_on_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    if previous and previous[0] != instance.product_id:
+        apply_rating_change(previous[0], old_rating=previous[1])
+        previous = None
+    apply_rating_change(
+        instance.product_id,
+        old_rating=previous[1] if previous else None,
+        new_rating=instance.rating,
+    )
+
+
+@receiver(post_delete, sender=ProductReview)
+def update_rating_on_delete(sender, instance, **kwargs):
+    apply_rating_change(instance.product_id, old_rating=instance.rating)
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def refresh_variant_index(sender, instance, using='default', **kwargs):
+    product_id = instance.product_id
+    transaction.on_commit(lambda: variant_index.refresh_product(product_id), using=using)
+    transaction.on_commit(invalidate_variant_options, using=using)
+
+
+@receiver(post_save, sender=Variant)
+@receiver(post_delete, sender=Variant)
+def invalidate_variant_index(sender, instance, using='default', created=False, **kwargs):
+    # A renamed or deleted Variant changes the keys of many products at once
+    if not created:
+        transaction.on_commit(variant_index.invalidate, using=using)
+    transaction.on_commit(invalidate_variant_options, using=using)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_responses(sender, instance, using='default', **kwargs):
+    # Category counts move too when a product is added, removed or recategorized
+    invalidate_tags_on_commit([f'product:{instance.productId}', 'catalog', 'categories'], using)
+
+
+@receiver(post_save, sender=Images)
+@receiver(post_delete, sender=Images)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=ProductAttributes)
+@receiver(post_delete, sender=ProductAttributes)
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+def invalidate_product_child_responses(sender, instance, using='default', **kwargs):
+    product_ids = Product.objects.using(using).filter(pk=instance.product_id).values_list('productId', flat=True)
+    invalidate_tags_on_commit([f'product:{product_id}' for product_id in product_ids] + ['catalog'], using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_responses(sender, instance, using='default', **kwargs):
+    invalidate_tags_on_commit([f'category:{instance.pk}', 'categories', 'catalog'], using)
+
+
+def _invalidate_related_products(products, using):
+    # Product details embed their seller, category and subcategory, and their
+    # ETags hash those rows' updated_at, so the cached bodies must go as well
+    product_ids = products.using(using).values_list('productId', flat=True)
+    invalidate_tags_on_commit([f'product:{product_id}' for product_id in product_ids] + ['catalog'], using)
+
+
+@receiver(post_save, sender=Seller)
+@receiver(pre_delete, sender=Seller)
+def invalidate_seller_product_responses(sender, instance, using='default', **kwargs):
+    # pre_delete: once the seller is gone its products no longer point to it
+    _invalidate_related_products(Product.objects.filter(seller=instance.pk), using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def invalidate_category_product_responses(sender, instance, using='default', **kwargs):
+    _invalidate_related_products(Product.objects.filter(category=instance.pk), using)
+
+
+@receiver(post_save, sender=SubCategory)
+@receiver(pre_delete, sender=SubCategory)
+def invalidate_subcategory_product_responses(sender, instance, using='default', **kwargs):
+    _invalidate_related_products(Product.objects.filter(subcategory=instance.pk), using)
+
+
+@receiver(post_save, sender=Variant)
+@receiver(post_delete, sender=Variant)
+def invalidate_variant_responses(sender, instance, using='default', **kwargs):
+    invalidate_tags_on_commit([f'category:{instance.category_id}'], using)
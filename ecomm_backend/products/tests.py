@@ -1,3 +1,318 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from accounts.models import CustomUser
+from sellers.models import Seller
+from .facets import price_buckets
+from .models import Category, Product, ProductReview, ProductVariant, Variant
+from .ratings import recompute_product_ratings
+from .search import FTS_TABLE, fts_enabled, search_products
+from .utils import VARIANT_OPTIONS_CACHE_KEY, get_variant_options
+from .variant_index import VERSION_KEY, VariantBitmapIndex, iter_ids, variant_index
+
+
+class ProductDetailCacheTests(TestCase):
+
+    def setUp(self):
+        caches['catalog'].clear()
+        user = CustomUser.objects.create_user('seller', 'seller@example.com', 'password')
+        self.seller = Seller.objects.create(user=user, business_name='Shop', business_address='Street', phone_number='1')
+        self.category = Category.objects.create(name='Shoes', slug='shoes')
+        Product.objects.create(
+            seller=self.seller, category=self.category, productId='pr-1', name='p', description='', base_price=10
+        )
+        self.url = '/api/products/product-detail/pr-1/'
+
+    def get(self, **headers):
+        return self.client.get(self.url, headers=headers)
+
+    def assertRenameRefreshes(self, rename, expected):
+        first = self.get()
+        self.assertEqual(self.get(if_none_match=first['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rename()
+
+        response = self.get(if_none_match=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn(expected, response.content.decode())
+
+    def test_seller_rename_refreshes_cached_detail(self):
+        def rename():
+            self.seller.business_name = 'Renamed shop'
+            self.seller.save()
+        self.assertRenameRefreshes(rename, 'Renamed shop')
+
+    def test_category_rename_refreshes_cached_detail(self):
+        def rename():
+            self.category.name = 'Boots'
+            self.category.save()
+        self.assertRenameRefreshes(rename, 'Boots')
+
+
+class FacetTests(TestCase):
+
+    def setUp(self):
+        caches['catalog'].clear()
+        variant_index.invalidate()
+        color, size = Variant.objects.create(name='Color'), Variant.objects.create(name='Size')
+        stock = [('Black', 'S', 150), ('Black', 'M', 420), ('White', 'M', 899), ('White', 'L', 1250), ('Red', 'L', 1490)]
+        for index, (color_value, size_value, price) in enumerate(stock):
+            product = Product.objects.create(productId=f'pr-{index}', name='p', description='', base_price=price)
+            ProductVariant.objects.create(product=product, variant=color, value=color_value)
+            ProductVariant.objects.create(product=product, variant=size, value=size_value)
+
+    def facets(self, query=''):
+        response = self.client.get(f'/api/products/list/?facets=1{query}')
+        self.assertEqual(response.status_code, 200)
+        facets = response.json()['facets']
+        variants = {
+            name: {option['value']: option['count'] for option in options}
+            for name, options in facets['variants'].items()
+        }
+        return response.json()['count'], variants, facets['price']
+
+    def test_variant_facet_ignores_only_its_own_filter(self):
+        count, variants, _ = self.facets('&variants=Color:Black')
+        self.assertEqual(count, 2)
+        self.assertEqual(variants['Size'], {'S': 1, 'M': 1})
+        self.assertEqual(variants['Color'], {'Black': 2, 'White': 2, 'Red': 1})
+
+        count, variants, _ = self.facets('&variants=Color:Black,White;Size:M')
+        self.assertEqual(count, 2)
+        self.assertEqual(variants['Size'], {'S': 1, 'M': 2, 'L': 1})
+        self.assertEqual(variants['Color'], {'Black': 1, 'White': 1})
+
+    def test_price_buckets_follow_the_prices(self):
+        _, _, price = self.facets()
+        self.assertEqual([(bucket['min'], bucket['max']) for bucket in price], [
+            (0, 500), (500, 1000), (1000, None),
+        ])
+        self.assertEqual([bucket['count'] for bucket in price], [2, 1, 2])
+
+        self.assertEqual(price_buckets(100, 1500), [(0, 500), (500, 1000), (1000, None)])
+        self.assertEqual(price_buckets(12, 48)[:2], [(10, 20), (20, 30)])
+        self.assertEqual(price_buckets(None, None), [])
+        self.assertEqual(price_buckets(20, 20), [(20, None)])
+
+
+class VariantOptionsCacheTests(TestCase):
+
+    def setUp(self):
+        cache.delete(VARIANT_OPTIONS_CACHE_KEY)
+        self.color = Variant.objects.create(name='Color')
+        self.product = Product.objects.create(productId='pr-1', name='p', description='', base_price=10)
+
+    def add_value(self, value):
+        # Written in another worker: this process's cache is not cleared
+        ProductVariant.objects.create(product=self.product, variant=self.color, value=value)
+
+    def test_options_are_cached_for_a_bounded_time(self):
+        self.add_value('Black')
+        self.assertEqual(get_variant_options()['data']['Color'], ['Black'])
+        self.add_value('White')
+        self.assertEqual(get_variant_options()['data']['Color'], ['Black'])
+
+        cache.delete(VARIANT_OPTIONS_CACHE_KEY)
+        with override_settings(VARIANT_OPTIONS_CACHE_TIMEOUT=0):
+            self.assertEqual(get_variant_options()['data']['Color'], ['Black', 'White'])
+            self.add_value('Red')
+            self.assertEqual(get_variant_options()['data']['Color'], ['Black', 'Red', 'White'])
+
+
+class VariantIndexTests(TestCase):
+
+    def setUp(self):
+        cache.delete(VERSION_KEY)
+        self.color, self.size = Variant.objects.create(name='Color'), Variant.objects.create(name='Size')
+        self.products = [
+            Product.objects.create(productId=f'pr-{index}', name='p', description='', base_price=10)
+            for index in range(3)
+        ]
+        for product, (color, size) in zip(self.products, [('Black', 'S'), ('Black', 'M'), ('White', 'M')]):
+            ProductVariant.objects.create(product=product, variant=self.color, value=color)
+            ProductVariant.objects.create(product=product, variant=self.size, value=size)
+        self.index = VariantBitmapIndex()
+
+    def match(self, variant_filters, index=None):
+        return set(iter_ids((index or self.index).match(variant_filters)))
+
+    def ids(self, *positions):
+        return {self.products[position].id for position in positions}
+
+    def test_values_are_ored_and_names_anded(self):
+        self.assertEqual(self.match({'color': ['Black']}), self.ids(0, 1))
+        self.assertEqual(self.match({'Color': ['Black', 'White'], 'size': ['M']}), self.ids(1, 2))
+        self.assertEqual(self.match({'Color': ['Red']}), set())
+
+    def test_refresh_product_updates_this_worker_and_signals_the_others(self):
+        other = VariantBitmapIndex()
+        self.assertEqual(self.match({'Color': ['White']}, other), self.ids(2))
+
+        ProductVariant.objects.filter(product=self.products[0], variant=self.color).update(value='White')
+        self.index.refresh_product(self.products[0].id)
+        self.assertEqual(self.match({'Color': ['White']}), self.ids(0, 2))
+        # The version bump makes the other worker rebuild
+        self.assertEqual(self.match({'Color': ['White']}, other), self.ids(0, 2))
+
+    def test_invalidate_rebuilds(self):
+        self.assertEqual(self.match({'Color': ['Black']}), self.ids(0, 1))
+        self.color.name = 'Colour'
+        self.color.save()
+        self.index.invalidate()
+        self.assertEqual(self.match({'Color': ['Black']}), set())
+        self.assertEqual(self.match({'Colour': ['Black']}), self.ids(0, 1))
+
+    def test_index_is_rebuilt_when_too_old(self):
+        self.assertEqual(self.match({'Size': ['S']}), self.ids(0))
+        # Changed without a version bump, as a worker on a per-process cache would
+        ProductVariant.objects.filter(product=self.products[1], variant=self.size).update(value='S')
+        self.assertEqual(self.match({'Size': ['S']}), self.ids(0))
+        with override_settings(VARIANT_INDEX_MAX_AGE=0):
+            self.assertEqual(self.match({'Size': ['S']}), self.ids(0, 1))
+
+
+class RatingAggregateTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.first, self.second = [
+            Product.objects.create(productId=f'pr-{index}', name='p', description='', base_price=10)
+            for index in range(2)
+        ]
+
+    def ratings(self, product):
+        product.refresh_from_db()
+        return (product.rating_count, product.rating_sum, product.rating_avg,
+                [getattr(product, f'rating_{star}') for star in range(1, 6)])
+
+    def review(self, product, rating):
+        return ProductReview.objects.create(product=product, user=self.user, rating=rating, comment='')
+
+    def test_create_edit_move_and_delete(self):
+        review = self.review(self.first, 4)
+        self.review(self.first, 5)
+        self.assertEqual(self.ratings(self.first), (2, 9, 4.5, [0, 0, 0, 1, 1]))
+
+        review.rating = 2
+        review.save()
+        self.assertEqual(self.ratings(self.first), (2, 7, 3.5, [0, 1, 0, 0, 1]))
+
+        review.product = self.second
+        review.save()
+        self.assertEqual(self.ratings(self.first), (1, 5, 5.0, [0, 0, 0, 0, 1]))
+        self.assertEqual(self.ratings(self.second), (1, 2, 2.0, [0, 1, 0, 0, 0]))
+
+        review.delete()
+        self.assertEqual(self.ratings(self.second), (0, 0, 0.0, [0, 0, 0, 0, 0]))
+
+    def test_recompute_matches_incremental(self):
+        self.review(self.first, 3)
+        self.review(self.first, 4)
+        self.review(self.second, 1)
+        incremental = [self.ratings(self.first), self.ratings(self.second)]
+
+        Product.objects.update(rating_count=7, rating_sum=0, rating_avg=0, rating_3=2)
+        self.assertEqual(recompute_product_ratings(batch_size=1), 2)
+        self.assertEqual([self.ratings(self.first), self.ratings(self.second)], incremental)
+
+    def test_product_edit_writes_only_edited_columns(self):
+        Seller.objects.create(user=self.user, business_name='Shop', business_address='Street', phone_number='1')
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.put(f'/api/sellers/products/{self.first.productId}/update/', {'name': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        [update] = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "products_product"')]
+        self.assertIn('"name"', update)
+        for column in ('rating_sum', 'rating_count', 'stock', 'sold'):
+            self.assertNotIn(f'"{column}"', update)
+        self.assertEqual(Product.objects.get(pk=self.first.pk).name, 'Renamed')
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        caches['catalog'].clear()
+        footwear = Category.objects.create(name='Footwear', slug='footwear')
+        catalog = [
+            ('Running shoe', 'Light and fast'),
+            ('Leather boot', 'Comes with shoe polish'),
+            ('Trail shoe', 'Grippy sole'),
+            ('Cotton sock', 'Soft'),
+        ]
+        self.products = {
+            name: Product.objects.create(
+                productId=f'pr-{index}', name=name, description=description, base_price=10, category=footwear
+            )
+            for index, (name, description) in enumerate(catalog)
+        }
+
+    def matches(self, query):
+        return set(search_products(Product.objects.all(), query).values_list('name', flat=True))
+
+    def listing(self, **params):
+        response = self.client.get('/api/products/list/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_index_follows_product_saves_and_deletes(self):
+        self.assertTrue(fts_enabled())
+        self.assertEqual(self.matches('shoe'), {'Running shoe', 'Leather boot', 'Trail shoe'})
+        # Category names are indexed too
+        self.assertEqual(len(self.matches('footwear')), 4)
+
+        sock = self.products['Cotton sock']
+        sock.name = 'Cotton shoe liner'
+        sock.save()
+        self.assertIn('Cotton shoe liner', self.matches('shoe'))
+
+        self.products['Trail shoe'].delete()
+        self.assertNotIn('Trail shoe', self.matches('shoe'))
+
+    def test_relevance_order_and_keyset_pages(self):
+        names = [product['name'] for product in self.listing(search='shoe', page_size=10)['data']]
+        # Name matches weigh more than description matches
+        self.assertEqual(set(names[:2]), {'Running shoe', 'Trail shoe'})
+        self.assertEqual(names[2], 'Leather boot')
+
+        paged, cursor = [], None
+        while True:
+            params = {'search': 'shoe', 'page_size': 1}
+            if cursor:
+                params['cursor'] = cursor
+            page = self.listing(**params)
+            paged += [product['name'] for product in page['data']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(paged, names)
+
+    def test_fts_syntax_in_the_query_is_treated_as_text(self):
+        # Unbalanced FTS5 syntax would be a MATCH error if passed through
+        names = {product['name'] for product in self.listing(search='shoe" OR (NEAR sole*')['data']}
+        self.assertEqual(names, set())
+        # Operators and quotes are dropped, each word must match
+        names = {product['name'] for product in self.listing(search='"trail" shoe*')['data']}
+        self.assertEqual(names, {'Trail shoe'})
+        self.assertEqual(self.listing(search='"()*')['data'], [])
+        self.assertEqual(self.matches('sho'), {'Running shoe', 'Leather boot', 'Trail shoe'})
+
+    def test_rebuild_command_repopulates_the_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        self.assertEqual(self.matches('shoe'), set())
+
+        output = StringIO()
+        call_command('rebuild_search_index', stdout=output)
+        self.assertIn('Indexed 4 products', output.getvalue())
+        self.assertEqual(self.matches('shoe'), {'Running shoe', 'Leather boot', 'Trail shoe'})
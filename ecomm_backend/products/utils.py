@@ -0,0 +1,80 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Images, Product, ProductAttributes, ProductReview, ProductVariant, Variant
+
+
+VARIANT_OPTIONS_CACHE_KEY = 'products:variant_options'
+
+
+def get_variant_options():
+    """
+    Return {'data': {name: [values]}, 'etag', 'last_modified'} for the filter
+    sidebar, built from one grouped query and cached until a variant changes.
+    With a per-process cache a change only clears the worker that made it,
+    so entries also expire after VARIANT_OPTIONS_CACHE_TIMEOUT seconds, which
+    bounds how long the other workers serve stale options.
+    """
+    cached = cache.get(VARIANT_OPTIONS_CACHE_KEY)
+    if cached is not None:
+        return cached
+
+    # LEFT JOIN keeps variant names that have no product values yet
+    rows = Variant.objects.values_list('name', 'productvariant__value').distinct().order_by(
+        'name', 'productvariant__value'
+    )
+    options = {}
+    for name, value in rows:
+        values = options.setdefault(name, [])
+        if value is not None:
+            values.append(value)
+
+    cached = {
+        'data': options,
+        'etag': hashlib.sha1(json.dumps(options, sort_keys=True).encode()).hexdigest(),
+        'last_modified': timezone.now(),
+    }
+    cache.set(VARIANT_OPTIONS_CACHE_KEY, cached, settings.VARIANT_OPTIONS_CACHE_TIMEOUT)
+    return cached
+
+
+def invalidate_variant_options():
+    cache.delete(VARIANT_OPTIONS_CACHE_KEY)
+
+
+def _child_versions(model, prefix):
+    # Latest updated_at plus row count: the count catches deletes of older rows
+    children = model.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    return {
+        f'{prefix}_updated': Subquery(children.annotate(latest=Max('updated_at')).values('latest')),
+        f'{prefix}_count': Subquery(children.annotate(total=Count('id')).values('total')),
+    }
+
+
+def product_detail_etag(request, productId):
+    """
+    Strong validator for productDetail, read with a single indexed lookup
+    instead of serializing the product. None when the product does not exist.
+    """
+    row = Product.objects.filter(productId=productId).annotate(
+        **_child_versions(Images, 'images'),
+        **_child_versions(ProductVariant, 'variants'),
+        **_child_versions(ProductAttributes, 'attributes'),
+        **_child_versions(ProductReview, 'reviews'),
+    ).values_list(
+        'updated_at', 'rating_count', 'rating_sum',
+        'seller__updated_at', 'category__updated_at', 'subcategory__updated_at',
+        'images_updated', 'images_count', 'variants_updated', 'variants_count',
+        'attributes_updated', 'attributes_count', 'reviews_updated', 'reviews_count',
+    ).first()
+    if row is None:
+        return None
+
+    # fields=/expand= change the representation, so they are part of the validator
+    query = sorted((key, value) for key, values in request.GET.lists() for value in values)
+    return hashlib.sha1(repr((row, query)).encode()).hexdigest()
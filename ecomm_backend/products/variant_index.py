@@ -0,0 +1,137 @@
+import json
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import ProductVariant
+
+
+# Shared across processes so a change made by one worker makes the others
+# rebuild. That needs a shared cache backend; with per-process locmem the
+# index is also rebuilt once it is VARIANT_INDEX_MAX_AGE seconds old.
+VERSION_KEY = 'products:variant_index:version'
+
+
+def _bitmap_from_ids(ids):
+    if not ids:
+        return 0
+    bits = bytearray(max(ids) // 8 + 1)
+    for product_id in ids:
+        bits[product_id >> 3] |= 1 << (product_id & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def iter_ids(bitmap):
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    for index, byte in enumerate(data):
+        if byte:
+            base = index * 8
+            for bit in range(8):
+                if byte >> bit & 1:
+                    yield base + bit
+
+
+def ids_filter(ids, using='default'):
+    """Q selecting `ids` without hitting SQLite's bound-parameter limit."""
+    ids = list(ids)
+    if connections[using].vendor == 'sqlite':
+        return Q(id__in=RawSQL('SELECT value FROM json_each(%s)', [json.dumps(ids)]))
+    return Q(id__in=ids)
+
+
+class VariantBitmapIndex:
+    """
+    Inverted index from (variant name, value) to a bitmap of product ids.
+    Bitmaps are Python ints (bit n set means product n has that option), so
+    AND/OR of filters are single big-int operations done in C.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._bitmaps = None
+        self._product_keys = None
+        self._version = None
+        self._built_at = None
+
+    def _rebuild(self):
+        ids_by_key = defaultdict(list)
+        product_keys = defaultdict(set)
+        rows = ProductVariant.objects.values_list('variant__name', 'value', 'product_id')
+        for name, value, product_id in rows.iterator(chunk_size=5000):
+            key = (name.lower(), value)
+            ids_by_key[key].append(product_id)
+            product_keys[product_id].add(key)
+
+        self._bitmaps = {key: _bitmap_from_ids(ids) for key, ids in ids_by_key.items()}
+        self._product_keys = product_keys
+        self._built_at = time.monotonic()
+
+    def _ensure_current(self):
+        version = cache.get(VERSION_KEY, 0)
+        expired = self._built_at is None or time.monotonic() - self._built_at > settings.VARIANT_INDEX_MAX_AGE
+        if self._bitmaps is None or version != self._version or expired:
+            self._rebuild()
+            self._version = version
+
+    def _bump_version(self):
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            version = 1
+            cache.set(VERSION_KEY, version, None)
+        return version
+
+    def match(self, variant_filters):
+        """
+        Bitmap of products matching {name: [values]}: values of one name are
+        OR'd, names are AND'd together.
+        """
+        with self._lock:
+            self._ensure_current()
+            result = None
+            for name, values in variant_filters.items():
+                union = 0
+                for value in values:
+                    union |= self._bitmaps.get((name.lower(), value), 0)
+                result = union if result is None else result & union
+            return result or 0
+
+    def refresh_product(self, product_id):
+        """Re-read one product's variants after a ProductVariant write."""
+        with self._lock:
+            if self._bitmaps is None:
+                # Nothing loaded here yet, but other workers still need to notice
+                self._bump_version()
+                return
+            self._ensure_current()
+
+            mask = ~(1 << product_id)
+            for key in self._product_keys.pop(product_id, ()):
+                self._bitmaps[key] &= mask
+
+            rows = ProductVariant.objects.filter(product_id=product_id).values_list('variant__name', 'value')
+            keys = {(name.lower(), value) for name, value in rows}
+            for key in keys:
+                self._bitmaps[key] = self._bitmaps.get(key, 0) | (1 << product_id)
+            if keys:
+                self._product_keys[product_id] = keys
+
+            # Another worker changed the index since we last synced: rebuild next time
+            previous, self._version = self._version, self._bump_version()
+            if self._version != previous + 1:
+                self._version = None
+
+    def invalidate(self):
+        """Drop the index everywhere; it is rebuilt on the next match()."""
+        with self._lock:
+            self._bitmaps = None
+            self._bump_version()
+
+
+variant_index = VariantBitmapIndex()
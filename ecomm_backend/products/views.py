@@ -3,12 +3,30 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework import status
 from django.db.models import Count, Q
+from django.views.decorators.http import condition
 
 from .models import Product, ProductAttributes, Variant, ProductVariant, Category, SubCategory, Images, ProductReview
 from .serializer import ProductSerializer, ProductAttributesSerializer, VariantSerializer, ProductVariantSerializer, CategorySerializer, SubCategorySerializer, ImagesSerializer, ProductReviewSerializer
 from orders.models import OrderItem
+from core.pagination import InvalidCursor, paginate_keyset, parse_page_size, estimate_count
+from .search import search_products
+from .facets import combine_filters, compute_facets, variant_dimension
+from .variant_index import ids_filter, iter_ids, variant_index
+from .utils import get_variant_options, product_detail_etag
+from core.cache import cache_response
+from core.serializers import parse_fieldset
 
 
+# Keyset orderings for each `sort` mode; the trailing id keeps them unique
+SORT_ORDERINGS = {
+    'newest': ('-created_at', '-id'),
+    'price_low': ('base_price', 'id'),
+    'price_high': ('-base_price', '-id'),
+    'popular': ('-sold', '-id'),
+    'relevance': ('search_rank', '-id'),
+}
+
+@cache_response(tags=lambda request: ['catalog'])
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def allProducts(request):
@@ -18,27 +36,36 @@ def allProducts(request):
         categories = request.GET.get('categories', '')
         min_price = request.GET.get('min_price')
         max_price = request.GET.get('max_price')
-        sort_by = request.GET.get('sort', 'newest')
+        sort_by = request.GET.get('sort', 'relevance' if search_query else 'newest')
         variants = request.GET.get('variants', '')  # Format: "color:red,blue;size:M,L"
+        cursor = request.GET.get('cursor')
+        estimate = request.GET.get('estimate_count', '').lower() in ('1', 'true')
+        with_facets = request.GET.get('facets', '').lower() in ('1', 'true')
+
+        try:
+            page_size = parse_page_size(request.GET.get('page_size'))
+        except ValueError:
+            return Response({
+                'status': 'error',
+                'message': 'Invalid page size'
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Start with all products
-        products = Product.objects.select_related('category').prefetch_related(
-            'images', 'variants', 'variants__variant'
-        ).all()
+        # Start with all products, joining/prefetching only what will be rendered
+        fields, expand = parse_fieldset(request)
+        products = ProductSerializer.optimize_queryset(Product.objects.all(), fields, expand)
 
-        # Apply search filter
+        # Apply search filter (FTS5 with BM25 ranking, icontains elsewhere)
         if search_query:
-            products = products.filter(
-                Q(name__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(category__name__icontains=search_query)
-            )
+            products = search_products(products, search_query)
+
+        # Remaining filters are kept per dimension so facets can leave their own out
+        filters = {}
 
         # Apply category filter
         if categories:
             try:
                 category_ids = [int(id) for id in categories.split(',')]
-                products = products.filter(category__id__in=category_ids)
+                filters['category'] = Q(category__id__in=category_ids)
             except ValueError:
                 return Response({
                     'status': 'error',
@@ -55,16 +82,11 @@ def allProducts(request):
                         if values:  # Only add if values are present
                             variant_filters[name] = values.split(',')
                 
-                variant_q = Q()
-                for variant_name, variant_values in variant_filters.items():
-                    if variant_values:  # Only add to query if values exist
-                        variant_q |= Q(
-                            variants__variant__name__iexact=variant_name,
-                            variants__value__in=variant_values
-                        )
-                
-                if variant_filters and variant_q:  # Only apply filter if we have valid conditions
-                    products = products.filter(variant_q).distinct()
+                # Options of one variant are OR'd on in-memory bitmaps; each variant is
+                # its own dimension, AND'd with the others, so its facet can leave it out
+                for name, values in variant_filters.items():
+                    bitmap = variant_index.match({name: values})
+                    filters[variant_dimension(name)] = ids_filter(iter_ids(bitmap), products.db)
             except Exception as e:
                 print(f"Error processing variant filters: {str(e)}")
                 return Response({
@@ -74,32 +96,50 @@ def allProducts(request):
 
         # Apply price range filter
         try:
+            price_q = Q()
             if min_price:
-                products = products.filter(base_price__gte=float(min_price))
+                price_q &= Q(base_price__gte=float(min_price))
             if max_price:
-                products = products.filter(base_price__lte=float(max_price))
+                price_q &= Q(base_price__lte=float(max_price))
+            if price_q:
+                filters['price'] = price_q
         except ValueError:
             return Response({
                 'status': 'error',
                 'message': 'Invalid price format'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Apply sorting
-        if sort_by == 'price_low':
-            products = products.order_by('base_price')
-        elif sort_by == 'price_high':
-            products = products.order_by('-base_price')
-        elif sort_by == 'popular':
-            products = products.order_by('-sold')
-        else:  # newest
-            products = products.order_by('-created_at')
-
-        serializer = ProductSerializer(products, many=True)
-        return Response({
+        facets = compute_facets(products, filters) if with_facets else None
+        products = products.filter(combine_filters(filters))
+
+        # Count before paginating, then fetch a single keyset page
+        if estimate:
+            count, count_is_estimate = estimate_count(products)
+        else:
+            count, count_is_estimate = products.count(), False
+
+        if sort_by == 'relevance' and not search_query:
+            sort_by = 'newest'
+        ordering = SORT_ORDERINGS.get(sort_by, SORT_ORDERINGS['newest'])
+        try:
+            page, next_cursor = paginate_keyset(products, ordering, cursor, page_size)
+        except InvalidCursor:
+            return Response({
+                'status': 'error',
+                'message': 'Invalid cursor'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = ProductSerializer(page, many=True, fields=fields, expand=expand)
+        response = {
             'status': 'success',
-            'count': products.count(),
+            'count': count,
+            'count_is_estimate': count_is_estimate,
+            'next_cursor': next_cursor,
             'data': serializer.data
-        })
+        }
+        if facets is not None:
+            response['facets'] = facets
+        return Response(response)
     except Exception as e:
         return Response({
             'status': 'error',
@@ -107,19 +147,16 @@ def allProducts(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@condition(
+    etag_func=lambda request: get_variant_options()['etag'],
+    last_modified_func=lambda request: get_variant_options()['last_modified'],
+)
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def getVariantOptions(request):
     try:
-        # Get all unique variant types and their values
-        variants = Variant.objects.all().values('name').distinct()
-        variant_options = {}
-        
-        for variant in variants:
-            values = ProductVariant.objects.filter(
-                variant__name=variant['name']
-            ).values_list('value', flat=True).distinct()
-            variant_options[variant['name']] = list(values)
+        # Variant name -> distinct values, from one grouped query (cached)
+        variant_options = get_variant_options()['data']
         
         return Response({
             'status': 'success',
@@ -132,12 +169,15 @@ def getVariantOptions(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@condition(etag_func=product_detail_etag)
+@cache_response(tags=lambda request, productId: [f'product:{productId}'])
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def productDetail(request, productId):
     try:
-        obj = Product.objects.get(productId=productId)
-        serializer = ProductSerializer(obj)
+        fields, expand = parse_fieldset(request)
+        obj = ProductSerializer.optimize_queryset(Product.objects.all(), fields, expand).get(productId=productId)
+        serializer = ProductSerializer(obj, fields=fields, expand=expand)
         return Response(serializer.data)
     except Product.DoesNotExist:
         return Response({'error': 'Product not found'}, status=404)
@@ -168,6 +208,7 @@ def addProductReview(request, productId):
         return Response({'error': str(e)}, status=500)
 
 
+@cache_response(tags=lambda request, productId: [f'product:{productId}'])
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def getAllReviews(request, productId):
@@ -182,6 +223,7 @@ def getAllReviews(request, productId):
         return Response({'error': str(e)}, status=500)
 
 
+@cache_response(tags=lambda request: ['categories'])
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def getCategories(request):
@@ -202,6 +244,7 @@ def getCategories(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@cache_response(tags=lambda request: [f"category:{request.GET.get('category')}"])
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_variants(request):
@@ -245,7 +288,7 @@ def check_user_ordered_product(request, productId):
                 user=request.user,
                 product=product,
                 is_ordered=True,
-                currentStatus__status='Delivered'
+                status='Delivered'
             ).exists()
 
         return Response({
@@ -1,6 +1,25 @@
 from django.contrib import admin
 
-from .models import Seller, SellerPayout
+from .models import PayoutSettlement, Seller, SellerBalance, SellerDailySales, SellerLedgerEntry, SellerPayout
 
 admin.site.register(Seller)
-admin.site.register(SellerPayout)
\ No newline at end of file
+admin.site.register(SellerPayout)
+admin.site.register(SellerDailySales)
+admin.site.register(SellerBalance)
+
+
+@admin.register(PayoutSettlement)
+class PayoutSettlementAdmin(admin.ModelAdmin):
+    list_display = ('settlementId', 'run_id', 'seller', 'amount', 'payout_count', 'created_at')
+    search_fields = ('settlementId', 'run_id')
+
+
+@admin.register(SellerLedgerEntry)
+class SellerLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ('seller', 'account', 'kind', 'amount', 'payouts', 'payout', 'reference', 'created_at')
+    list_filter = ('account', 'kind', 'created_at')
+    search_fields = ('payout__payoutId', 'reference')
+
+    # The ledger is append-only
+    def has_change_permission(self, request, obj=None):
+        return False
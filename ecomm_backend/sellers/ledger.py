@@ -0,0 +1,138 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import SellerBalance, SellerLedgerEntry, SellerPayout
+
+
+# Balance columns each ledger account rolls up into
+ACCOUNT_FIELDS = {
+    'pending': ('pending_amount', 'pending_count'),
+    'paid': ('paid_amount', 'paid_count'),
+}
+BALANCE_FIELDS = ('pending_amount', 'pending_count', 'paid_amount', 'paid_count')
+
+CENT = Decimal('0.01')
+
+
+def _apply(seller_id, changes):
+    # Same upsert as the sales rollup: increment, or create the first balance row
+    rows = SellerBalance.objects.filter(seller_id=seller_id)
+    increments = {name: F(name) + value for name, value in changes.items()}
+    if rows.update(**increments, updated_at=timezone.now()):
+        return
+    try:
+        with transaction.atomic():
+            SellerBalance.objects.create(seller_id=seller_id, **changes)
+    except IntegrityError:
+        rows.update(**increments, updated_at=timezone.now())
+
+
+def post(entries):
+    """Append `entries` and add them to their sellers' balances, atomically."""
+    if not entries:
+        return []
+    deltas = defaultdict(lambda: defaultdict(int))
+    for entry in entries:
+        amount_field, count_field = ACCOUNT_FIELDS[entry.account]
+        deltas[entry.seller_id][amount_field] += Decimal(entry.amount)
+        deltas[entry.seller_id][count_field] += entry.payouts
+
+    with transaction.atomic():
+        entries = SellerLedgerEntry.objects.bulk_create(entries)
+        for seller_id, changes in deltas.items():
+            _apply(seller_id, changes)
+    return entries
+
+
+def credit_paid_payouts(order_item_ids):
+    """
+    Credit the payouts of `order_item_ids` whose buyer has paid and that are
+    not credited yet. Safe to call again for the same items: card orders are
+    credited when their payouts are created, cash on delivery when delivered.
+    """
+    payouts = SellerPayout.objects.filter(
+        orderItem__in=order_item_ids,
+        seller__isnull=False,
+        isRefunded=False,
+        orderItem__paymentDetail__is_paid=True,
+    ).exclude(ledger_entries__kind='payment')
+    return post([
+        SellerLedgerEntry(
+            seller_id=payout.seller_id,
+            account='paid' if payout.is_paid else 'pending',
+            kind='payment',
+            amount=payout.amount,
+            payouts=1,
+            payout=payout,
+        )
+        for payout in payouts
+    ])
+
+
+def debit_refunded_payout(payout):
+    """Take a refunded payout back out of the account it was credited to, once."""
+    kinds = set(payout.ledger_entries.values_list('kind', flat=True))
+    if 'payment' not in kinds or 'refund' in kinds:
+        return None
+    return post([
+        SellerLedgerEntry(
+            seller_id=payout.seller_id,
+            account='paid' if payout.is_paid else 'pending',
+            kind='refund',
+            amount=-payout.amount,
+            payouts=-1,
+            payout=payout,
+        )
+    ])
+
+
+def post_settlement(seller_id, amount, count, reference):
+    """Move `count` payouts worth `amount` from pending to paid."""
+    return post([
+        SellerLedgerEntry(seller_id=seller_id, account='pending', kind='settlement',
+                          amount=-amount, payouts=-count, reference=reference),
+        SellerLedgerEntry(seller_id=seller_id, account='paid', kind='settlement',
+                          amount=amount, payouts=count, reference=reference),
+    ])
+
+
+def ledger_totals(seller_ids):
+    """The balances `seller_ids` should have, summed from their ledger entries."""
+    totals = {seller_id: dict.fromkeys(BALANCE_FIELDS, 0) for seller_id in seller_ids}
+    rows = SellerLedgerEntry.objects.filter(seller__in=seller_ids).values('seller', 'account').annotate(
+        amount=Sum('amount'), payouts=Sum('payouts')
+    ).order_by()
+    for row in rows:
+        amount_field, count_field = ACCOUNT_FIELDS[row['account']]
+        # SQLite sums decimals as floats
+        totals[row['seller']][amount_field] = Decimal(row['amount']).quantize(CENT)
+        totals[row['seller']][count_field] = row['payouts']
+    return totals
+
+
+def balance_drift(seller_ids, fix=False):
+    """
+    Compare the stored balances of `seller_ids` with their ledger. Returns
+    {seller_id: (expected, stored)} for the sellers that differ; with `fix`,
+    the stored balances are reset to the ledger in the same transaction.
+    """
+    with transaction.atomic():
+        expected = ledger_totals(seller_ids)
+        stored = {
+            row.pop('seller'): row
+            for row in SellerBalance.objects.filter(seller__in=seller_ids).values('seller', *BALANCE_FIELDS)
+        }
+        drift = {}
+        for seller_id, totals in expected.items():
+            balance = stored.get(seller_id, dict.fromkeys(BALANCE_FIELDS, 0))
+            if any(Decimal(totals[name]) != Decimal(balance[name]) for name in BALANCE_FIELDS):
+                drift[seller_id] = (totals, balance)
+
+        if fix:
+            for seller_id, (totals, _) in drift.items():
+                SellerBalance.objects.update_or_create(seller_id=seller_id, defaults=totals)
+    return drift
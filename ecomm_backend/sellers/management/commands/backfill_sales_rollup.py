@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from sellers.sales import rebuild_sales_rollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per seller, per day sales rollup from the orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seller', type=int, action='append', dest='sellers', help='Only this seller id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows = rebuild_sales_rollup(options['sellers'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {rows} daily sales rows'))
@@ -0,0 +1,81 @@
+import random
+import time
+import zoneinfo
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from core.ids import generate_id
+from orders.models import OrderItem, OrderItemStatus
+from products.models import Product
+from sellers.models import Seller
+from sellers.sales import GRANULARITIES, rebuild_sales_rollup, sales_series
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the sales graph query per granularity over a year of delivered order '
+        'items, from the rollup and from the items. Runs in a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=100000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            seller = self._populate(options['items'], options['batch_size'])
+            today = timezone.localdate()
+            start = today - timedelta(days=364)
+            sources = [('rollup', None), ('items', zoneinfo.ZoneInfo('Asia/Karachi'))]
+
+            for granularity in GRANULARITIES:
+                for source, tz in sources:
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        series = sales_series(seller, start, today, granularity, tz)
+                        elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f'{granularity:>5} from {source:<6}: {len(series):>3} buckets  '
+                        f'{len(queries.captured_queries)} queries  {elapsed * 1000:8.1f} ms'
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _populate(self, count, batch_size):
+        user = CustomUser.objects.create_user('bench-seller', 'bench-seller@example.com', 'password')
+        buyer = CustomUser.objects.create_user('bench-buyer', 'bench-buyer@example.com', 'password')
+        seller = Seller.objects.create(user=user, business_name='Bench', business_address='-', phone_number='0')
+        products = [
+            Product.objects.create(seller=seller, productId=generate_id('pr-'), name=f'Bench {index}',
+                                   description='', base_price=10 + index, stock=0)
+            for index in range(20)
+        ]
+
+        now = timezone.now()
+        started = time.perf_counter()
+        for offset in range(0, count, batch_size):
+            items = []
+            for _ in range(min(batch_size, count - offset)):
+                product, qty = random.choice(products), random.randint(1, 3)
+                items.append(OrderItem(
+                    orderItemId=generate_id('ITM-'), user=buyer, product=product, qty=qty, is_ordered=True,
+                    unit_price=product.base_price, line_total=product.base_price * qty, status='Delivered',
+                ))
+            items = OrderItem.objects.bulk_create(items)
+            OrderItemStatus.objects.bulk_create([OrderItemStatus(orderItem=item, status='Delivered') for item in items])
+            # auto_now_add ignores values given on create, so spread the items over the year afterwards
+            for item in items:
+                item.created_at = now - timedelta(seconds=random.randint(0, 365 * 86400))
+            OrderItem.objects.bulk_update(items, ['created_at'])
+
+        rows = rebuild_sales_rollup()
+        self.stdout.write(
+            f'Created {count} delivered items and {rows} rollup rows in {time.perf_counter() - started:.1f} s'
+        )
+        return seller
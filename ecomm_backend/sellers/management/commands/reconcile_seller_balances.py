@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from sellers.ledger import balance_drift
+from sellers.models import Seller
+
+
+class Command(BaseCommand):
+    help = 'Re-derive seller balances from the payout ledger and report (or fix) any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Sellers per batch')
+        parser.add_argument('--fix', action='store_true', help='Reset drifted balances to the ledger')
+
+    def handle(self, *args, **options):
+        checked = drifted = 0
+        last_id = 0
+        while True:
+            # Keyset over sellers, so memory stays at one batch however many there are
+            seller_ids = list(
+                Seller.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not seller_ids:
+                break
+            last_id = seller_ids[-1]
+
+            drift = balance_drift(seller_ids, fix=options['fix'])
+            for seller_id, (expected, stored) in drift.items():
+                changes = ', '.join(
+                    f'{name} {stored[name]} -> {expected[name]}'
+                    for name in expected if expected[name] != stored[name]
+                )
+                self.stdout.write(f'Seller {seller_id}: {changes}')
+            checked += len(seller_ids)
+            drifted += len(drift)
+
+        summary = f'Checked {checked} sellers, {drifted} drifted'
+        if options['fix'] and drifted:
+            summary += ', fixed'
+        self.stdout.write(self.style.SUCCESS(summary) if not drifted else self.style.WARNING(summary))
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from sellers.settlement import new_run_id, settle_payouts, write_settlement_file
+
+
+class Command(BaseCommand):
+    help = (
+        'Settle unpaid, non-refunded seller payouts: one settlement per seller, then '
+        'a CSV or JSONL settlement file. Rerun with --run-id to resume a crashed run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--run-id', help='Resume this run instead of starting a new one')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--output-dir', default=settings.PAYOUT_SETTLEMENT_DIR)
+        parser.add_argument('--batch-size', type=int, default=500, help='Sellers fetched at a time')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Payout rows fetched at a time for the file')
+
+    def handle(self, *args, **options):
+        run_id = options['run_id'] or new_run_id()
+        self.stdout.write(f'Settlement run {run_id}')
+
+        sellers = 0
+        for settlement in settle_payouts(run_id, batch_size=options['batch_size']):
+            sellers += 1
+            self.stdout.write(
+                f'  seller {settlement.seller_id}: {settlement.payout_count} payouts, {settlement.amount}'
+            )
+
+        path, rows = write_settlement_file(
+            run_id, options['output_dir'], options['format'], chunk_size=options['chunk_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Settled {sellers} sellers in this pass; {rows} payouts written to {path}'))
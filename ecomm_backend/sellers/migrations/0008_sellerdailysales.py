@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sellers', '0007_sellerpayout_isrefunded'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SellerDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('refunds', models.PositiveIntegerField(default=0)),
+                ('refund_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='sellers.seller')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('seller', 'day'), name='unique_seller_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def opening_balances(apps, schema_editor):
+    # Credit every payout the stats counted so far: paid by the buyer and not
+    # refunded; payouts already marked paid go straight to the paid account
+    db = schema_editor.connection.alias
+    SellerPayout = apps.get_model('sellers', 'SellerPayout')
+    SellerLedgerEntry = apps.get_model('sellers', 'SellerLedgerEntry')
+    SellerBalance = apps.get_model('sellers', 'SellerBalance')
+
+    payouts = SellerPayout.objects.using(db).filter(
+        seller__isnull=False, isRefunded=False, orderItem__paymentDetail__is_paid=True
+    ).order_by('id')
+    batch = []
+    for payout in payouts.iterator(chunk_size=2000):
+        batch.append(SellerLedgerEntry(
+            seller_id=payout.seller_id,
+            account='paid' if payout.is_paid else 'pending',
+            kind='payment',
+            amount=payout.amount,
+            payouts=1,
+            payout_id=payout.id,
+            reference='opening balance',
+        ))
+        if len(batch) == 2000:
+            SellerLedgerEntry.objects.using(db).bulk_create(batch)
+            batch = []
+    SellerLedgerEntry.objects.using(db).bulk_create(batch)
+
+    balances = {}
+    totals = SellerLedgerEntry.objects.using(db).values('seller', 'account').annotate(
+        amount=Sum('amount'), payouts=Sum('payouts')
+    ).order_by()
+    for row in totals:
+        balance = balances.setdefault(row['seller'], SellerBalance(seller_id=row['seller']))
+        setattr(balance, f"{row['account']}_amount", row['amount'])
+        setattr(balance, f"{row['account']}_count", row['payouts'])
+    SellerBalance.objects.using(db).bulk_create(balances.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0023_mark_delivered_payments_paid'),
+        ('sellers', '0008_sellerdailysales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SellerBalance',
+            fields=[
+                ('seller', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance', serialize=False, to='sellers.seller')),
+                ('pending_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('pending_count', models.IntegerField(default=0)),
+                ('paid_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('paid_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SellerLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid')], max_length=20)),
+                ('kind', models.CharField(choices=[('payment', 'Payment'), ('refund', 'Refund'), ('settlement', 'Settlement')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('payouts', models.IntegerField(default=0)),
+                ('reference', models.CharField(blank=True, default='', max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payout', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='sellers.sellerpayout')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='sellers.seller')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['seller', 'id'], name='ledger_seller_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('payout__isnull', False)), fields=('payout', 'kind'), name='unique_payout_entry')],
+            },
+        ),
+        migrations.RunPython(opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0023_mark_delivered_payments_paid'),
+        ('sellers', '0009_seller_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayoutSettlement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('settlementId', models.CharField(max_length=30, unique=True)),
+                ('run_id', models.CharField(db_index=True, max_length=30)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payout_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='settlements', to='sellers.seller')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='sellerpayout',
+            name='settlement',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payouts', to='sellers.payoutsettlement'),
+        ),
+        migrations.AddIndex(
+            model_name='sellerpayout',
+            index=models.Index(condition=models.Q(('isRefunded', False), ('is_paid', False)), fields=['seller', 'id'], name='payout_unsettled_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='payoutsettlement',
+            constraint=models.UniqueConstraint(fields=('seller', 'run_id'), name='unique_settlement_per_run'),
+        ),
+    ]
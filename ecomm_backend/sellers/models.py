@@ -21,6 +21,24 @@ class Seller(models.Model):
         return self.business_name
 
 
+class PayoutSettlement(models.Model):
+    """One seller's share of a `manage.py settle_payouts` run."""
+    settlementId = models.CharField(max_length=30, unique=True)
+    run_id = models.CharField(max_length=30, db_index=True)
+    seller = models.ForeignKey(Seller, on_delete=models.PROTECT, related_name='settlements')
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payout_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['seller', 'run_id'], name='unique_settlement_per_run'),
+        ]
+
+    def __str__(self):
+        return self.settlementId
+
+
 class SellerPayout(models.Model):
     payoutId = models.CharField(max_length=20, unique=True)
     seller = models.ForeignKey(Seller, on_delete=models.SET_NULL, null=True, blank=True)
@@ -32,8 +50,117 @@ class SellerPayout(models.Model):
 
     isRefunded = models.BooleanField(default=False)
 
+    # Set, together with is_paid, when the payout is settled
+    settlement = models.ForeignKey(
+        PayoutSettlement, on_delete=models.SET_NULL, null=True, blank=True, related_name='payouts'
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Payouts still to be settled, per seller
+            models.Index(
+                fields=['seller', 'id'],
+                condition=models.Q(is_paid=False, isRefunded=False),
+                name='payout_unsettled_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return self.payoutId
+
+class SellerDailySales(models.Model):
+    """
+    Sales of one seller, bucketed by the day the items were ordered. Kept up to
+    date by sellers.sales as items are delivered (and so paid) or refunded;
+    `manage.py backfill_sales_rollup` rebuilds it from the orders.
+    """
+    seller = models.ForeignKey(Seller, on_delete=models.CASCADE, related_name='daily_sales')
+    day = models.DateField()
+
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.PositiveIntegerField(default=0)
+    # Order items, which is what the dashboard has always counted as orders
+    orders = models.PositiveIntegerField(default=0)
+    refunds = models.PositiveIntegerField(default=0)
+    refund_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['seller', 'day'], name='unique_seller_day'),
+        ]
+
+    def __str__(self):
+        return f'{self.seller_id} {self.day}'
+
+
+LEDGER_ACCOUNT_CHOICES = (
+    ('pending', 'Pending'),
+    ('paid', 'Paid'),
+)
+
+LEDGER_KIND_CHOICES = (
+    ('payment', 'Payment'),
+    ('refund', 'Refund'),
+    ('settlement', 'Settlement'),
+)
+
+class SellerLedgerEntry(models.Model):
+    """
+    Append-only record of what a seller is owed. A paid order item credits its
+    payout to `pending`, a refund debits the account the payout sits in, and a
+    settlement moves money from `pending` to `paid` with a pair of entries.
+    SellerBalance is the running sum of these entries.
+    """
+    seller = models.ForeignKey(Seller, on_delete=models.CASCADE, related_name='ledger_entries')
+    account = models.CharField(max_length=20, choices=LEDGER_ACCOUNT_CHOICES)
+    kind = models.CharField(max_length=20, choices=LEDGER_KIND_CHOICES)
+    # Signed changes to the account's amount and number of payouts
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    payouts = models.IntegerField(default=0)
+
+    payout = models.ForeignKey(
+        SellerPayout, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries'
+    )
+    reference = models.CharField(max_length=100, blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            # A payout is credited and refunded at most once
+            models.UniqueConstraint(
+                fields=['payout', 'kind'],
+                condition=models.Q(payout__isnull=False),
+                name='unique_payout_entry',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['seller', 'id'], name='ledger_seller_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.seller_id} {self.kind} {self.amount}'
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Ledger entries are append-only, post a correcting entry instead')
+        super().save(*args, **kwargs)
+
+
+class SellerBalance(models.Model):
+    """Running totals of a seller's ledger, so payout stats are a single row read."""
+    seller = models.OneToOneField(Seller, on_delete=models.CASCADE, primary_key=True, related_name='balance')
+    pending_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    pending_count = models.IntegerField(default=0)
+    paid_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
-        return self.payoutId
\ No newline at end of file
+        return f'{self.seller_id}'
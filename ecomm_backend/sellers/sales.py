@@ -0,0 +1,203 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DateField, DecimalField, Exists, F, OuterRef, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate, TruncDay, TruncMonth, TruncWeek, TruncYear
+from django.utils import timezone
+
+from orders.models import OrderItem, OrderItemStatus, Refund
+from .models import SellerDailySales
+
+
+COUNTERS = ('revenue', 'units', 'orders', 'refunds', 'refund_amount')
+
+GRANULARITIES = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'year': TruncYear,
+}
+
+
+def _add(seller_id, day, **deltas):
+    # Increment in place; the first event of a seller's day creates the row. A
+    # concurrent first event loses on unique_seller_day and increments instead.
+    rows = SellerDailySales.objects.filter(seller_id=seller_id, day=day)
+    changes = {name: F(name) + value for name, value in deltas.items()}
+    if rows.update(**changes, updated_at=timezone.now()):
+        return
+    try:
+        with transaction.atomic():
+            SellerDailySales.objects.create(seller_id=seller_id, day=day, **deltas)
+    except IntegrityError:
+        rows.update(**changes, updated_at=timezone.now())
+
+
+def _order_day(order_item):
+    return timezone.localdate(order_item.created_at)
+
+
+def record_sale(order_item):
+    """Count a delivered (and therefore paid) item. Call in the delivering transaction."""
+    seller_id = order_item.product.seller_id
+    if seller_id is None:
+        return
+    _add(seller_id, _order_day(order_item), revenue=order_item.getOrderItemTotal(), units=order_item.qty, orders=1)
+
+
+def record_refund(order_item, amount):
+    """Count a refund against the day its item was ordered. Call in the refunding transaction."""
+    seller_id = order_item.product.seller_id
+    if seller_id is None:
+        return
+    _add(seller_id, _order_day(order_item), refunds=1, refund_amount=Decimal(str(amount or 0)))
+
+
+def rebuild_sales_rollup(seller_ids=None, batch_size=1000):
+    """
+    Recompute the rollup from the orders with two grouped queries and replace
+    the rows of `seller_ids` (all sellers when None) in one transaction.
+    Returns the number of rows written.
+    """
+    money = DecimalField(max_digits=14, decimal_places=2)
+    delivered = OrderItemStatus.objects.filter(orderItem=OuterRef('pk'), status='Delivered')
+    items = OrderItem.objects.filter(is_ordered=True, product__seller__isnull=False).filter(Exists(delivered))
+    refunds = Refund.objects.filter(returnRequest__orderItem__product__seller__isnull=False)
+    if seller_ids is not None:
+        items = items.filter(product__seller__in=seller_ids)
+        refunds = refunds.filter(returnRequest__orderItem__product__seller__in=seller_ids)
+
+    totals = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    sales = items.values(seller=F('product__seller'), order_day=TruncDate('created_at')).annotate(
+        revenue=Coalesce(Sum('line_total'), Value(0), output_field=money),
+        units=Sum('qty'),
+        orders=Count('id'),
+    ).order_by()
+    for row in sales.iterator():
+        totals[row['seller'], row['order_day']].update(revenue=row['revenue'], units=row['units'], orders=row['orders'])
+
+    refunded = refunds.values(
+        seller=F('returnRequest__orderItem__product__seller'),
+        order_day=TruncDate('returnRequest__orderItem__created_at'),
+    ).annotate(
+        refunds=Count('id'),
+        refund_amount=Coalesce(Sum('amount'), Value(0), output_field=money),
+    ).order_by()
+    for row in refunded.iterator():
+        totals[row['seller'], row['order_day']].update(refunds=row['refunds'], refund_amount=row['refund_amount'])
+
+    with transaction.atomic():
+        existing = SellerDailySales.objects.all()
+        if seller_ids is not None:
+            existing = existing.filter(seller__in=seller_ids)
+        existing.delete()
+        SellerDailySales.objects.bulk_create(
+            [SellerDailySales(seller_id=seller_id, day=day, **counters) for (seller_id, day), counters in totals.items()],
+            batch_size=batch_size,
+        )
+    return len(totals)
+
+
+def _bucket_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'year':
+        return day.replace(month=1, day=1)
+    return day
+
+
+def _next_bucket(start, granularity):
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if granularity == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start.replace(year=start.year + 1)
+
+
+def sales_series(seller, start, end, granularity='day', tz=None):
+    """
+    Net sales of `seller` per bucket for the days `start`..`end` (inclusive,
+    in `tz`), as a dense list of (bucket start date, Decimal) with empty
+    buckets filled with zero. Grouping happens in one SQL query: over the
+    rollup when `tz` is the timezone its days were cut in, otherwise over the
+    delivered order items themselves so days follow the requested timezone.
+    """
+    tz = tz or timezone.get_default_timezone()
+    trunc = GRANULARITIES[granularity]
+
+    if str(tz) == str(timezone.get_default_timezone()):
+        rows = SellerDailySales.objects.filter(seller=seller, day__gte=start, day__lte=end).annotate(
+            bucket=trunc('day', output_field=DateField())
+        ).values('bucket').annotate(sales=Sum(F('revenue') - F('refund_amount'))).order_by()
+    else:
+        delivered = OrderItemStatus.objects.filter(orderItem=OuterRef('pk'), status='Delivered')
+        rows = OrderItem.objects.filter(
+            product__seller=seller,
+            is_ordered=True,
+            created_at__gte=timezone.make_aware(datetime.combine(start, time.min), tz),
+            created_at__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz),
+        ).filter(Exists(delivered)).annotate(
+            bucket=trunc('created_at', output_field=DateField(), tzinfo=tz)
+        ).values('bucket').annotate(
+            sales=Sum(F('line_total') - Coalesce(F('refund__amount'), Value(Decimal('0'))))
+        ).order_by()
+
+    totals = {row['bucket']: row['sales'] or Decimal('0') for row in rows}
+    series = []
+    bucket = _bucket_start(start, granularity)
+    while bucket <= end:
+        series.append((bucket, totals.get(bucket, Decimal('0'))))
+        bucket = _next_bucket(bucket, granularity)
+    return series
+
+
+def _window(start, end):
+    condition = Q(day__lte=end)
+    if start is not None:
+        condition &= Q(day__gte=start)
+    return condition
+
+
+def _stats(revenue, refund_amount, orders, refunds):
+    # Net of refunds: a refunded item no longer counts as a sale
+    total_sales = (revenue or 0) - (refund_amount or 0)
+    total_orders = (orders or 0) - (refunds or 0)
+    return {
+        'total_sales': float(total_sales),
+        'total_orders': total_orders,
+        'average_order': float(total_sales / total_orders) if total_orders > 0 else 0,
+    }
+
+
+def compare_sales(seller, current, previous=None):
+    """
+    Dashboard stats of `seller` for the `current` and `previous` windows, each
+    a (start, end) pair of days with start None meaning since the beginning.
+    Both come from one scan of the rollup using conditional sums, so the two
+    windows are always measured the same way. Returns (stats, previous_stats).
+    """
+    windows = {'current': _window(*current)}
+    if previous is not None:
+        windows['previous'] = _window(*previous)
+
+    aggregates = {
+        f'{name}_{field}': Sum(Case(When(condition, then=F(field))))
+        for name, condition in windows.items()
+        for field in ('revenue', 'refund_amount', 'orders', 'refunds')
+    }
+    rollup = SellerDailySales.objects.filter(seller=seller)
+    starts = [window[0] for window in (current, previous) if window is not None]
+    if None not in starts:
+        rollup = rollup.filter(day__gte=min(starts))
+    totals = rollup.aggregate(**aggregates)
+
+    def stats(name):
+        return _stats(*(totals.get(f'{name}_{field}') for field in ('revenue', 'refund_amount', 'orders', 'refunds')))
+
+    return stats('current'), stats('previous')
@@ -4,12 +4,20 @@ from orders.models import OrderItem
 
 
 class SellerSerializer(serializers.ModelSerializer):
+    # Full profile, including the nested user: only for the seller's own profile endpoints
     class Meta:
         model = Seller
         depth = 1
         fields = '__all__'
 
 
+class SellerSummarySerializer(serializers.ModelSerializer):
+    # Compact seller embedded in product payloads; needs only select_related('seller')
+    class Meta:
+        model = Seller
+        fields = ['id', 'business_name', 'is_active', 'is_approved']
+
+
 class SellerPayoutSerializer(serializers.ModelSerializer):
     
     class Meta:
@@ -0,0 +1,120 @@
+import csv
+import json
+import os
+from decimal import Decimal
+from pathlib import Path
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Sum
+from django.utils import timezone
+
+from core.ids import generate_id
+from .ledger import CENT, post_settlement
+from .models import PayoutSettlement, SellerLedgerEntry, SellerPayout
+
+
+EXPORT_FIELDS = ('settlementId', 'sellerId', 'businessName', 'payoutId', 'orderItemId', 'amount', 'settledAt')
+
+
+def new_run_id():
+    return generate_id('RUN-')
+
+
+def settleable_payouts():
+    """Unpaid, non-refunded payouts that were credited to the seller's pending balance."""
+    credited = SellerLedgerEntry.objects.filter(payout=OuterRef('pk'), kind='payment')
+    return SellerPayout.objects.filter(
+        is_paid=False, isRefunded=False, settlement__isnull=True, seller__isnull=False
+    ).filter(Exists(credited))
+
+
+def settle_seller(seller_id, run_id):
+    """
+    Settle every settleable payout of one seller in one transaction: the
+    settlement record, one UPDATE marking the payouts paid and the matching
+    ledger entries. Returns the settlement, or None when there was nothing to
+    settle or the seller is already settled in this run.
+    """
+    with transaction.atomic():
+        if PayoutSettlement.objects.filter(seller_id=seller_id, run_id=run_id).exists():
+            return None
+        settlement = PayoutSettlement.objects.create(
+            settlementId=generate_id('SET-'), run_id=run_id, seller_id=seller_id
+        )
+        settled = settleable_payouts().filter(seller_id=seller_id).update(
+            settlement=settlement, is_paid=True, updated_at=timezone.now()
+        )
+        if not settled:
+            transaction.set_rollback(True)
+            return None
+
+        totals = settlement.payouts.aggregate(amount=Sum('amount'), count=Count('id'))
+        settlement.amount, settlement.payout_count = Decimal(totals['amount']).quantize(CENT), totals['count']
+        settlement.save(update_fields=['amount', 'payout_count'])
+        post_settlement(seller_id, settlement.amount, settlement.payout_count, settlement.settlementId)
+        return settlement
+
+
+def settle_payouts(run_id, batch_size=500):
+    """
+    Settle all sellers with settleable payouts, one transaction each, and
+    yield their settlements. Sellers are fetched in keyset batches, so memory
+    does not grow with the number of payouts or sellers. Running again with
+    the same `run_id` after a crash settles only the sellers still pending.
+    """
+    last_seller_id = 0
+    while True:
+        seller_ids = list(
+            settleable_payouts().filter(seller_id__gt=last_seller_id)
+            .order_by('seller_id').values_list('seller_id', flat=True).distinct()[:batch_size]
+        )
+        if not seller_ids:
+            return
+        for seller_id in seller_ids:
+            settlement = settle_seller(seller_id, run_id)
+            if settlement is not None:
+                yield settlement
+        last_seller_id = seller_ids[-1]
+
+
+def _export_rows(run_id, chunk_size):
+    payouts = SellerPayout.objects.filter(settlement__run_id=run_id).order_by('settlement_id', 'id').values_list(
+        'settlement__settlementId', 'seller_id', 'seller__business_name', 'payoutId',
+        'orderItem__orderItemId', 'amount', 'settlement__created_at',
+    )
+    for row in payouts.iterator(chunk_size=chunk_size):
+        yield dict(zip(EXPORT_FIELDS, row))
+
+
+def write_settlement_file(run_id, directory, fmt='csv', chunk_size=2000):
+    """
+    Write one line per payout settled in `run_id`, streamed from the database
+    in chunks. The file is written under a temporary name and renamed into
+    place, so a crash never leaves a partial file behind; rerunning rewrites
+    it from the database. Returns (path, rows).
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'settlement-{run_id}.{fmt}'
+    partial = path.with_name(path.name + '.partial')
+
+    rows = 0
+    with open(partial, 'w', newline='', encoding='utf-8') as output:
+        if fmt == 'csv':
+            writer = csv.DictWriter(output, fieldnames=EXPORT_FIELDS)
+            writer.writeheader()
+            write = writer.writerow
+        else:
+            def write(row):
+                output.write(json.dumps(row, default=str) + '\n')
+
+        for row in _export_rows(run_id, chunk_size):
+            row['amount'] = str(row['amount'])
+            row['settledAt'] = row['settledAt'].isoformat()
+            write(row)
+            rows += 1
+        output.flush()
+        os.fsync(output.fileno())
+
+    os.replace(partial, path)
+    return path, rows
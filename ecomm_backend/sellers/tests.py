@@ -1,3 +1,181 @@
-from django.test import TestCase
+import csv
+import tempfile
+import threading
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.db import connections, transaction
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from accounts.models import Address, CustomUser
+from core.outbox import run_pending
+from orders.checkout import place_order
+from orders.models import Order, OrderItem
+from products.models import Product
+from .ledger import balance_drift, credit_paid_payouts, debit_refunded_payout, post_settlement
+from .models import PayoutSettlement, Seller, SellerBalance, SellerDailySales, SellerPayout
+from .sales import rebuild_sales_rollup, record_refund, record_sale
+from .settlement import settle_payouts, write_settlement_file
+
+
+class SellerOrderMixin:
+    """A seller with one placed cash on delivery order of three lines."""
+
+    def setUp(self):
+        user = CustomUser.objects.create_user('seller', 'seller@example.com', 'password')
+        seller = Seller.objects.create(user=user, business_name='Shop', business_address='Street', phone_number='1')
+        buyer = CustomUser.objects.create_user('buyer', 'buyer@example.com', 'password')
+        address = Address.objects.create(user=buyer, street_address='s', city='c', state='s', postal_code='1')
+        order = Order.objects.create(orderId='ORD-buyer', user=buyer)
+        for index in range(3):
+            product = Product.objects.create(
+                seller=seller, productId=f'pr-{index}', name='p', description='', base_price=10, stock=5
+            )
+            order.orderItems.add(OrderItem.objects.create(orderItemId=f'ITM-{index}', user=buyer, product=product, qty=2))
+        self.seller = seller
+        self.items = place_order(buyer, order, address, 'cod')
+
+
+class SellerOrderTestCase(SellerOrderMixin, TestCase):
+    pass
+
+
+class SalesRollupTests(SellerOrderTestCase):
+
+    def test_incremental_rollup_matches_rebuild(self):
+        for item in self.items[:2]:
+            item.set_status('Delivered')
+            record_sale(item)
+        record_refund(self.items[0], '4.50')
+
+        fields = ('seller', 'day', 'revenue', 'units', 'orders', 'refunds', 'refund_amount')
+        incremental = list(SellerDailySales.objects.values(*fields))
+        self.assertEqual(len(incremental), 1)
+        self.assertEqual(
+            (incremental[0]['revenue'], incremental[0]['units'], incremental[0]['orders']), (40, 4, 2)
+        )
+
+        # The rebuild counts refunds from Refund rows, which this test does not create
+        SellerDailySales.objects.update(refunds=0, refund_amount=0)
+        incremental = list(SellerDailySales.objects.values(*fields))
+        self.assertEqual(rebuild_sales_rollup(), 1)
+        self.assertEqual(list(SellerDailySales.objects.values(*fields)), incremental)
+
+
+class OrderItemDetailTests(SellerOrderTestCase):
+
+    def test_renders_in_a_fixed_number_of_queries(self):
+        client = APIClient()
+        client.force_authenticate(self.seller.user)
+        item = self.items[0]
+        item.set_status('Shipped')
+        item.set_status('Delivered')
+        url = f'/api/sellers/orders/order-item-detail/{item.orderItemId}/'
+
+        # The item with its to-one relations joined in, three prefetches
+        # (variants, images, statuses) and the return request lookup
+        with self.assertNumQueries(5):
+            data = client.get(url).data['data']
+        self.assertEqual(data['user'], {'id': item.user_id, 'username': 'buyer', 'email': 'buyer@example.com'})
+        self.assertEqual([event['status'] for event in data['allStatus']], ['Pending', 'Shipped', 'Delivered'])
+        self.assertEqual(data['product']['productId'], item.product.productId)
+
+        self.assertEqual(client.get(url, {'fields': 'orderItemId,status'}).data['data'], {
+            'orderItemId': item.orderItemId, 'status': 'Delivered',
+        })
+
+
+class ConcurrentDeliveryTests(SellerOrderMixin, TransactionTestCase):
+
+    def test_item_is_delivered_and_counted_once(self):
+        item = self.items[0]
+        item.set_status('Shipped')
+        url = f'/api/sellers/orders/update-status/{item.orderItemId}/'
+
+        # Both requests read the item as Shipped before either one writes
+        barrier = threading.Barrier(2)
+
+        def atomic():
+            barrier.wait()
+            return transaction.atomic()
+
+        responses = []
+
+        def deliver():
+            client = APIClient()
+            client.force_authenticate(self.seller.user)
+            try:
+                responses.append(client.post(url, {'status': 'Delivered'}, format='json').status_code)
+            finally:
+                connections.close_all()
+
+        with mock.patch('sellers.views.transaction', SimpleNamespace(atomic=atomic)):
+            threads = [threading.Thread(target=deliver) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(sorted(responses), [200, 409])
+        sales = SellerDailySales.objects.get(seller=self.seller)
+        self.assertEqual((sales.revenue, sales.units, sales.orders), (20, 2, 1))
+        self.assertEqual(item.statuses.filter(status='Delivered').count(), 1)
+
+
+class LedgerTests(SellerOrderTestCase):
+
+    def balance(self):
+        balance = SellerBalance.objects.get(seller=self.seller)
+        return balance.pending_amount, balance.pending_count, balance.paid_amount, balance.paid_count
+
+    def test_payment_refund_and_settlement(self):
+        run_pending()
+        item_ids = [item.id for item in self.items]
+        # Cash on delivery: nothing is owed until the buyer pays
+        self.assertEqual(credit_paid_payouts(item_ids), [])
+
+        for item in self.items:
+            item.paymentDetail.is_paid = True
+            item.paymentDetail.save()
+        self.assertEqual(len(credit_paid_payouts(item_ids)), 3)
+        self.assertEqual(credit_paid_payouts(item_ids), [])
+        self.assertEqual(self.balance(), (54, 3, 0, 0))
+
+        payout = SellerPayout.objects.get(orderItem=self.items[0])
+        debit_refunded_payout(payout)
+        self.assertIsNone(debit_refunded_payout(payout))
+        post_settlement(self.seller.id, Decimal('18'), 1, 'SET-1')
+        self.assertEqual(self.balance(), (18, 1, 18, 1))
+
+        self.assertEqual(balance_drift([self.seller.id]), {})
+        SellerBalance.objects.update(paid_count=5)
+        self.assertEqual(list(balance_drift([self.seller.id], fix=True)), [self.seller.id])
+        self.assertEqual(balance_drift([self.seller.id]), {})
+
+
+class SettlementTests(SellerOrderTestCase):
+
+    def test_settles_credited_payouts_once_per_run(self):
+        run_pending()
+        for item in self.items[:2]:
+            item.paymentDetail.is_paid = True
+            item.paymentDetail.save()
+        credit_paid_payouts([item.id for item in self.items])
+
+        [settlement] = settle_payouts('RUN-1')
+        self.assertEqual((settlement.amount, settlement.payout_count), (36, 2))
+        self.assertEqual(SellerPayout.objects.filter(is_paid=True, settlement=settlement).count(), 2)
+        self.assertEqual(SellerBalance.objects.get(seller=self.seller).paid_amount, 36)
+
+        # Resuming the run finds nothing left to settle
+        self.assertEqual(list(settle_payouts('RUN-1')), [])
+        self.assertEqual(PayoutSettlement.objects.count(), 1)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path, rows = write_settlement_file('RUN-1', directory)
+            with open(path, newline='') as settlement_file:
+                lines = list(csv.DictReader(settlement_file))
+        self.assertEqual(rows, 2)
+        self.assertEqual({line['settlementId'] for line in lines}, {settlement.settlementId})
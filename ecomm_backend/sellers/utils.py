@@ -1,10 +1,5 @@
-import random
-import string
+from core.ids import generate_id
 
 def generate_product_id():
-    prefix = "pr-"
-    random_string = ''.join(random.choices(string.ascii_letters + string.digits, k=8))
-    product_id = f"{prefix}{random_string}"
-    
-    return product_id
-
+    # Time-ordered, so new products land at the end of the productId index
+    return generate_id("pr-")
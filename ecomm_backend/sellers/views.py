@@ -5,8 +5,10 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.db.models import Sum, Avg, Count, F, Q, Case, When, IntegerField, DecimalField
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from datetime import timedelta
-from orders.models import OrderItem, ReturnRequest, Refund, ReturnRequestStatus, OrderItemStatus
+from orders.models import OrderItem, Payment, ReturnRequest, Refund, ReturnRequestStatus
+from orders.utils import generate_unique_id
 from orders.serializer import OrderItemSerializer, ReturnRequestSerializer
 from sellers.models import Seller, SellerPayout
 from sellers.serializer import SellerSerializer
@@ -14,13 +16,16 @@ from products.models import Product, ProductAttributes, ProductReview, ProductVa
 from rest_framework import status
 from products.serializer import ProductSerializer, SubCategorySerializer
 from django.db import transaction
+from core.serializers import parse_fieldset
 
 
+from .ledger import credit_paid_payouts, debit_refunded_payout
+from .sales import GRANULARITIES, compare_sales, record_refund, record_sale, sales_series
 from .utils import generate_product_id
 
-import uuid
 import json
 import os
+import zoneinfo
 
 
 
@@ -220,16 +225,24 @@ def updateProduct(request, productId):
                 'message': f'Product with ID {productId} not found'
             }, status=status.HTTP_404_NOT_FOUND)
 
-        # Update basic product info
+        # Update basic product info. Only the edited columns are written, so the
+        # rating aggregates and stock/sold counters, which are maintained with
+        # F() updates, are not overwritten with the values loaded above.
         product.name = request.data.get('name', product.name)
         product.description = request.data.get('description', product.description)
+        product.category_id = request.data.get('category', product.category_id)
+        product.subcategory_id = request.data.get('subcategory', product.subcategory_id)
+        update_fields = ['name', 'description', 'category', 'subcategory', 'updated_at']
         try:
             if 'base_price' in request.data:
                 product.base_price = float(request.data['base_price'])
+                update_fields.append('base_price')
             if 'stock' in request.data:
                 product.stock = int(request.data['stock'])
+                update_fields.append('stock')
             if 'discount_price' in request.data:
                 product.discount_price = float(request.data['discount_price']) if request.data['discount_price'] else None
+                update_fields.append('discount_price')
         except (ValueError, TypeError) as e:
             print(f"Error converting numeric fields: {str(e)}")
             return Response({
@@ -237,9 +250,7 @@ def updateProduct(request, productId):
                 'message': f'Invalid numeric value provided: {str(e)}'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        product.category_id = request.data.get('category', product.category_id)
-        product.subcategory_id = request.data.get('subcategory', product.subcategory_id)
-        product.save()
+        product.save(update_fields=update_fields)
 
         # Update attributes
         attributes = request.data.get('attributes')
@@ -348,53 +359,23 @@ def get_dashboard_stats(request):
         period = request.query_params.get('period', 'monthly')
         seller = request.user.seller  # Ensure user has seller profile
         
-        # Calculate date range based on period
-        now = timezone.now()
-        if period == 'daily':
-            start_date = now - timedelta(days=1)
-        elif period == 'monthly':
-            start_date = now - timedelta(days=30)
-        elif period == 'yearly':
-            start_date = now - timedelta(days=365)
-        else:  # all
-            start_date = None
-        
-        # Base queryset
-        order_items = OrderItem.objects.filter(product__seller=seller, is_ordered=True, currentStatus__status='Delivered', paymentDetail__is_paid=True)
-        if start_date:
-            order_items = order_items.filter(created_at__gte=start_date)
-        
-        # Calculate total sales
-        total_sales = sum(item.getOrderItemTotal() for item in order_items)
-        total_orders = order_items.count()
-        average_order = total_sales / total_orders if total_orders > 0 else 0
-        
-        stats = {
-            'total_sales': float(total_sales),
-            'total_orders': total_orders,
-            'average_order': float(average_order),
-        }
-        
-        # Calculate trends
-        if start_date:
-            previous_period_orders = OrderItem.objects.filter(
-                product__seller=seller,
-                is_ordered=True,
-                created_at__lt=start_date,
-                created_at__gte=start_date - timedelta(days=(now - start_date).days)
-            )
-        else:
-            previous_period_orders = OrderItem.objects.none()
-        
-        previous_total_sales = sum(item.getOrderItemTotal() for item in previous_period_orders)
-        previous_total_orders = previous_period_orders.count()
-        previous_average_order = previous_total_sales / previous_total_orders if previous_total_orders > 0 else 0
-        
-        previous_stats = {
-            'total_sales': float(previous_total_sales),
-            'total_orders': previous_total_orders,
-            'average_order': float(previous_average_order),
-        }
+        # Windows are whole days of the rollup, ending today
+        today = timezone.localdate()
+        days = {'daily': 1, 'monthly': 30, 'yearly': 365}.get(period)
+        current = (today - timedelta(days=days - 1) if days else None, today)
+
+        # previous_period (default): the window of the same length just before;
+        # previous_year: the same days a year earlier; or an explicit range
+        compare_to = request.query_params.get('compare_to', 'previous_period')
+        try:
+            previous = comparison_window(current, compare_to)
+        except ValueError:
+            return Response({
+                'status': 'error',
+                'message': 'Invalid compare_to, use previous_period, previous_year or YYYY-MM-DD..YYYY-MM-DD'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        stats, previous_stats = compare_sales(seller, current, previous)
         
         # Calculate trends as percentages
         trends = {
@@ -405,8 +386,10 @@ def get_dashboard_stats(request):
         
         return Response({
             'stats': stats,
+            'previous_stats': previous_stats,
             'trends': trends,
-            'period': period
+            'period': period,
+            'compare_to': {'start': previous[0], 'end': previous[1]} if previous else None
         })
     except AttributeError:
         return Response(
@@ -426,44 +409,44 @@ def get_sales_graph_data(request):
         period = request.query_params.get('period', 'monthly')
         seller = request.user.seller  # Ensure user has seller profile
         
-        now = timezone.now()
-        
         if period == 'daily':
-            days = 7
-            date_format = '%Y-%m-%d'
+            days, default_granularity = 7, 'day'
         elif period == 'monthly':
-            days = 30
-            date_format = '%Y-%m'
+            days, default_granularity = 30, 'month'
         elif period == 'yearly':
-            days = 365
-            date_format = '%Y'
+            days, default_granularity = 365, 'year'
         else:  # all
-            days = 365
-            date_format = '%Y-%m'
-        
-        # Get all order items for the period
-        order_items = OrderItem.objects.filter(
-            product__seller=seller,
-            is_ordered=True,
-            created_at__gte=now - timedelta(days=days)
-        ).order_by('created_at')
-        
-        # Group by date and calculate sales
-        sales_data = {}
-        for item in order_items:
-            date_key = item.created_at.strftime(date_format)
-            if date_key not in sales_data:
-                sales_data[date_key] = 0
-            sales_data[date_key] += float(item.getOrderItemTotal())
-        
-        # Convert to list format
+            days, default_granularity = 365, 'month'
+
+        granularity = request.query_params.get('granularity', default_granularity)
+        if granularity not in GRANULARITIES:
+            return Response({
+                'status': 'error',
+                'message': f'Invalid granularity, use one of {", ".join(GRANULARITIES)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        tz_name = request.query_params.get('tz')
+        try:
+            tz = zoneinfo.ZoneInfo(tz_name) if tz_name else timezone.get_default_timezone()
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            return Response({
+                'status': 'error',
+                'message': 'Invalid timezone'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # One grouped query; buckets without sales come back as zero
+        end = timezone.localdate(timezone=tz)
+        series = sales_series(seller, end - timedelta(days=days - 1), end, granularity, tz)
+        date_format = {'day': '%Y-%m-%d', 'week': '%Y-%m-%d', 'month': '%Y-%m', 'year': '%Y'}[granularity]
         formatted_data = [
-            {'date': date, 'sales': sales}
-            for date, sales in sorted(sales_data.items())
+            {'date': bucket.strftime(date_format), 'sales': float(sales)}
+            for bucket, sales in series
         ]
-        
+
         return Response({
             'status': 'success',
+            'granularity': granularity,
+            'tz': str(tz),
             'data': formatted_data
         })
     except AttributeError:
@@ -477,6 +460,29 @@ def get_sales_graph_data(request):
             status=500
         )
 
+def comparison_window(current, compare_to):
+    start, end = current
+    if compare_to == 'previous_period':
+        if start is None:
+            return None
+        return start - timedelta(days=(end - start).days + 1), start - timedelta(days=1)
+    if compare_to == 'previous_year':
+        if start is None:
+            return None
+        return _year_earlier(start), _year_earlier(end)
+
+    first, _, last = compare_to.partition('..')
+    first, last = parse_date(first), parse_date(last)
+    if first is None or last is None or first > last:
+        raise ValueError(compare_to)
+    return first, last
+
+def _year_earlier(day):
+    try:
+        return day.replace(year=day.year - 1)
+    except ValueError:  # 29 February
+        return day.replace(year=day.year - 1, day=28)
+
 def calculate_trend(current, previous):
     if not previous:
         return 0
@@ -735,8 +741,7 @@ def seller_orders(request):
             'user',
             'currentStatus'
         ).prefetch_related(
-            'product__images',
-            'allStatus'
+            'product__images'
         ).order_by('-created_at')
         
         print(f"Found {order_items.count()} order items")  # Debug log
@@ -798,12 +803,12 @@ def update_order_status(request, orderItemId):
             'Shipped': ['Delivered'],
         }
 
-        order_item = OrderItem.objects.get(
+        order_item = OrderItem.objects.select_related('product').get(
             orderItemId=orderItemId,
             product__seller=seller
         )
 
-        current_status = order_item.currentStatus.status if order_item.currentStatus else 'Pending'
+        current_status = order_item.status or 'Pending'
 
         if new_status not in valid_transitions.get(current_status, []):
             return Response({
@@ -822,26 +827,33 @@ def update_order_status(request, orderItemId):
                     'message': 'Shipping details are required for Shipped status'
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Validate shipping details if status is Delivered
-        if new_status == 'Delivered':
-            order_item.paymentDetail.is_paid = True
-
-        # Create new status
-        new_status_obj = OrderItemStatus.objects.create(
-            orderItem=order_item,
-            status=new_status,
-            shipped_from=shipping_details.get('shippedFrom') if shipping_details else None,
-            shipped_to=shipping_details.get('shippedTo') if shipping_details else None
-        )
-
-        # Update current status
-        order_item.currentStatus = new_status_obj
-
-        
-        order_item.save()
-
-        # Add to all statuses
-        order_item.allStatus.add(new_status_obj)
+        with transaction.atomic():
+            # Compare-and-set on the status read above: of two concurrent requests
+            # for the same transition only one moves the item, so a sale is never
+            # recorded twice
+            claimed = OrderItem.objects.filter(pk=order_item.pk, status=order_item.status).update(
+                status=new_status, updated_at=timezone.now()
+            )
+            if not claimed:
+                return Response({
+                    'status': 'error',
+                    'message': 'Order status was changed by another request, please reload'
+                }, status=status.HTTP_409_CONFLICT)
+
+            # Cash on delivery is paid on delivery; a delivered item counts as a sale
+            if new_status == 'Delivered':
+                Payment.objects.filter(pk=order_item.paymentDetail_id).update(is_paid=True, updated_at=timezone.now())
+                record_sale(order_item)
+                credit_paid_payouts([order_item.id])
+
+            # Record the new status; the item is saved once with its other changes
+            order_item.set_status(
+                new_status,
+                save=False,
+                shipped_from=shipping_details.get('shippedFrom') if shipping_details else None,
+                shipped_to=shipping_details.get('shippedTo') if shipping_details else None
+            )
+            order_item.save(update_fields=['currentStatus', 'status', 'courier', 'trackingId', 'updated_at'])
 
         return Response({
             'status': 'success',
@@ -899,17 +911,7 @@ def update_return_request_status(request, orderItemId):
         elif new_status == 'Returned':
             orderItem_status = 'Returned'
 
-        newOrderItemStatus = OrderItemStatus.objects.create(
-            orderItem=order_item,
-            status=orderItem_status,
-        )
-
-        # Update current status
-        order_item.currentStatus = newOrderItemStatus
-        order_item.save()
-
-        # Add to all statuses
-        order_item.allStatus.add(newOrderItemStatus)
+        order_item.set_status(orderItem_status)
 
         # Update return request status
         return_request.currentStatus = new_status_obj
@@ -943,7 +945,10 @@ def get_order_item_detail(request, orderItemId):
     try:
         seller = request.user.seller
 
-        sellerOrderItem = OrderItem.objects.get(orderItemId=orderItemId, product__seller=seller) 
+        fields, expand = parse_fieldset(request)
+        sellerOrderItem = OrderItemSerializer.optimize_queryset(
+            OrderItem.objects.all(), fields, expand
+        ).get(orderItemId=orderItemId, product__seller=seller)
 
         returnRequestObj = ReturnRequest.objects.filter(orderItem=sellerOrderItem)
         if returnRequestObj.exists():
@@ -956,7 +961,7 @@ def get_order_item_detail(request, orderItemId):
         
             
         
-        data = OrderItemSerializer(sellerOrderItem)
+        data = OrderItemSerializer(sellerOrderItem, fields=fields, expand=expand)
         
         return Response({
             'status': 'success',
@@ -985,7 +990,7 @@ def get_order_item_detail(request, orderItemId):
 @transaction.atomic
 def process_refund(request, order_item_id):
     try:
-        order_item = OrderItem.objects.get(orderItemId=order_item_id)
+        order_item = OrderItem.objects.select_related('product').get(orderItemId=order_item_id)
         return_request = ReturnRequest.objects.get(orderItem=order_item)
         
 
@@ -993,7 +998,7 @@ def process_refund(request, order_item_id):
 
         # Create refund record
         newRefund =Refund.objects.create(
-            refundId=f"REF-{uuid.uuid4().hex[:8].upper()}",
+            refundId=generate_unique_id(prefix="REF"),
             returnRequest=return_request,
             amount=request.data.get('amount'),
             paymentMethod=request.data.get('paymentMethod'),
@@ -1013,25 +1018,19 @@ def process_refund(request, order_item_id):
 
         return_request.allStatus.add(new_status_obj)
 
-        # Create new order item status
-        new_order_status = OrderItemStatus.objects.create(
-            orderItem=order_item,
-            status='Refunded'
-        )
-
-        # Update SellerPayout
-        seller_payout = SellerPayout.objects.get(orderItem=order_item)
+        # Update SellerPayout; locked so a concurrent settlement cannot be overwritten
+        seller_payout = SellerPayout.objects.select_for_update().get(orderItem=order_item)
         seller_payout.isRefunded = True
         seller_payout.save()
+        debit_refunded_payout(seller_payout)
 
 
         # Update order item status
-        order_item.currentStatus = new_order_status
+        order_item.set_status('Refunded', save=False)
         order_item.refund = newRefund
         order_item.save()
 
-        # Add to all statuses
-        order_item.allStatus.add(new_order_status)
+        record_refund(order_item, newRefund.amount)
 
         return Response({
             'status': 'success',
@@ -1061,9 +1060,9 @@ def get_seller_by_id(request, seller_id):
         total_orders = OrderItem.objects.filter(product__seller=seller).count()
         total_sales = OrderItem.objects.filter(
             product__seller=seller,
-            status=OrderItemStatus.DELIVERED
+            status='Delivered'
         ).aggregate(
-            total=Sum(F('quantity') * F('price'))
+            total=Sum('line_total')
         )['total'] or 0
         
         avg_rating = ProductReview.objects.filter(
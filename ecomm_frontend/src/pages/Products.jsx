@@ -16,6 +16,8 @@ const Products = () => {
   const [searchParams, setSearchParams] = useSearchParams();
   const [products, setProducts] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [selectedCategories, setSelectedCategories] = useState(
     searchParams.get('categories') ? searchParams.get('categories').split(',') : []
   );
@@ -99,16 +101,22 @@ const Products = () => {
     fetchVariantOptions();
   }, []);
 
-  const fetchProducts = async () => {
+  // Without a cursor the list starts over; with one the next page is appended
+  const fetchProducts = async (cursor = null) => {
+    const setBusy = cursor ? setLoadingMore : setLoading;
     try {
-      setLoading(true);
+      setBusy(true);
       const params = new URLSearchParams(searchParams);
+      if (cursor) params.set('cursor', cursor);
       const response = await axiosInstance.get(`/api/products/list/?${params.toString()}`);
       
       if (response.data?.status === 'success') {
-        setProducts(response.data.data || []);
+        const page = response.data.data || [];
+        setProducts(prev => (cursor ? [...prev, ...page] : page));
+        setNextCursor(response.data.next_cursor || null);
       } else {
-        setProducts([]);
+        if (!cursor) setProducts([]);
+        setNextCursor(null);
         setToast({
           type: 'error',
           message: 'Failed to load products'
@@ -116,13 +124,14 @@ const Products = () => {
       }
     } catch (error) {
       console.error('Error fetching products:', error);
-      setProducts([]);
+      if (!cursor) setProducts([]);
+      setNextCursor(null);
       setToast({
         type: 'error',
         message: 'Error loading products'
       });
     } finally {
-      setLoading(false);
+      setBusy(false);
     }
   };
 
@@ -358,7 +367,21 @@ const Products = () => {
                 <FontAwesomeIcon icon={faSpinner} className="text-indigo-600 text-4xl animate-spin" />
               </div>
             ) : (
-              <ProductList products={products} />
+              <>
+                <ProductList products={products} />
+                {nextCursor && (
+                  <div className="flex justify-center mt-8">
+                    <button
+                      onClick={() => fetchProducts(nextCursor)}
+                      disabled={loadingMore}
+                      className="flex items-center px-6 py-2 text-sm font-medium text-gray-700 bg-white border border-gray-300 rounded-md hover:bg-gray-50 disabled:opacity-50 disabled:cursor-not-allowed"
+                    >
+                      {loadingMore && <FontAwesomeIcon icon={faSpinner} className="mr-2 animate-spin" />}
+                      Load more
+                    </button>
+                  </div>
+                )}
+              </>
             )}
           </div>
         </div>
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Link } from 'react-router-dom';
 import axiosInstance from '../../utils/axiosInstance';
 import { formatPrice } from '../../utils/helpers';
@@ -16,47 +16,47 @@ import {
 const Orders = () => {
   const [orderItems, setOrderItems] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [activeSection, setActiveSection] = useState('all');
-  const [filteredOrderItems, setFilteredOrderItems] = useState([]);
+  const activeSectionRef = useRef(activeSection);
 
-  useEffect(() => {
-    fetchOrderItems();
-  }, []);
+  // Each tab is filtered on the server, so it covers every page, not just the loaded ones
+  const sectionFilters = {
+    all: {},
+    pending: { status: 'Pending' },
+    completed: { status: 'Delivered' },
+    'to-pay': { paid: 'false' },
+    returned: { status: 'Returned' }
+  };
 
+  // Changing tabs starts the list over from the first page
   useEffect(() => {
-    filterOrderItems(activeSection);
-  }, [activeSection, orderItems]);
+    activeSectionRef.current = activeSection;
+    setLoading(true);
+    setNextCursor(null);
+    fetchOrderItems();
+  }, [activeSection]);
 
-  const fetchOrderItems = async () => {
+  // Order history is paginated; each further page is appended to the list
+  const fetchOrderItems = async (cursor = null) => {
+    const section = activeSection;
     try {
-      const response = await axiosInstance.get('/api/orders/user-orders/');
+      if (cursor) setLoadingMore(true);
+      const params = { ...sectionFilters[section] };
+      if (cursor) params.cursor = cursor;
+      const response = await axiosInstance.get('/api/orders/user-orders/', { params });
+      // A response for a tab the user has already left is dropped
+      if (section !== activeSectionRef.current) return;
       if (response.data.status === 'success') {
-        setOrderItems(response.data.data);
-        setFilteredOrderItems(response.data.data);
+        setOrderItems(prev => (cursor ? [...prev, ...response.data.data] : response.data.data));
+        setNextCursor(response.data.next_cursor || null);
       }
     } catch (error) {
       console.error('Error fetching order items:', error);
     } finally {
       setLoading(false);
-    }
-  };
-
-  const filterOrderItems = (section) => {
-    switch (section) {
-      case 'pending':
-        setFilteredOrderItems(orderItems.filter(item => item.currentStatus.status === 'Pending'));
-        break;
-      case 'completed':
-        setFilteredOrderItems(orderItems.filter(item => item.currentStatus?.status === 'Delivered'));
-        break;
-      case 'to-pay':
-        setFilteredOrderItems(orderItems.filter(item => !item.paymentDetail.is_paid));
-        break;
-      case 'returned':
-        setFilteredOrderItems(orderItems.filter(item => item.currentStatus?.status === 'Returned'));
-        break;
-      default:
-        setFilteredOrderItems(orderItems);
+      setLoadingMore(false);
     }
   };
 
@@ -95,7 +95,7 @@ const Orders = () => {
               {section.label}
               {activeSection === section.id && (
                 <span className="ml-2 bg-indigo-500 text-white px-2 py-0.5 rounded-full text-xs">
-                  {filteredOrderItems.length}
+                  {orderItems.length}
                 </span>
               )}
             </button>
@@ -109,8 +109,8 @@ const Orders = () => {
       </h1>
       
       <div className="space-y-6">
-        {filteredOrderItems.length > 0 ? (
-          filteredOrderItems.map((item) => (
+        {orderItems.length > 0 ? (
+          orderItems.map((item) => (
             <div
               key={item.id}
               className="bg-white rounded-lg shadow-sm border border-gray-200 p-6"
@@ -189,6 +189,19 @@ const Orders = () => {
           </div>
         )}
       </div>
+
+      {nextCursor && (
+        <div className="flex justify-center my-8">
+          <button
+            onClick={() => fetchOrderItems(nextCursor)}
+            disabled={loadingMore}
+            className="flex items-center px-6 py-2 text-sm font-medium text-gray-700 bg-white border border-gray-300 rounded-lg hover:bg-gray-50 disabled:opacity-50 disabled:cursor-not-allowed"
+          >
+            {loadingMore && <FontAwesomeIcon icon={faSpinner} className="mr-2 animate-spin" />}
+            Load more orders
+          </button>
+        </div>
+      )}
     </div>
   );
 };